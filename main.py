@@ -12,14 +12,32 @@ import os
 from pathlib import Path
 import json
 from services.sb_user_services import fetch_user_profile # Assuming this path is correct relative to your project structure
-from services.system_messages import AKASI_SYSTEM_MESSAGE_CONTENT, BODY_SCANNER_SYSTEM_MESSAGE_CONTENT, WELLNESS_JOURNAL_SYSTEM_MESSAGE_TEMPLATE
+from services.system_messages import AKASI_SYSTEM_MESSAGE_CONTENT, BODY_SCANNER_SYSTEM_MESSAGE_CONTENT, WELLNESS_JOURNAL_SYSTEM_MESSAGE_TEMPLATE, CONTEXT_SUMMARY_SYSTEM_MESSAGE_CONTENT, FUSED_TURN_SYSTEM_MESSAGE_TEMPLATE, BODY_SCANNER_COMMAND_GUIDELINES, WELLNESS_JOURNAL_GUIDELINES_TEMPLATE
+from services.turn_scheduler import TurnScheduler
+from services.journal_updates import JournalUpdateBroker
+from services.journal_store import JournalStore, render_journal_context
+from services.journal_gate import JournalGate
+from services.body_region_resolver import BodyRegionResolver
+from services.scanner_command_cache import ScannerCommandCache
+from services.model_registry import ModelRegistry
+from services.attachment_store import AttachmentStore, LocalDirectoryBackend, SupabaseStorageBackend, base64_payload
+from services.attachment_gc import AttachmentGarbageCollector
+from services.attachment_cache import AttachmentCache
+from services.upload_reader import UploadReader, UploadRejected
+from services.checkpoint_memory import BoundedMemorySaver
+from services.sqlite_checkpointer import SqliteCheckpointSaver
+from services.context_manager import ContextManager, ContextPolicy, estimate_text_tokens, message_text
+from services.message_transforms import strip_images_from_history, image_free_replacements, latest_turn_has_images
+from services.image_summary_cache import ImageSummaryCache, image_set_key
+from services.image_normalizer import ImageNormalizer, NORMALIZABLE_CONTENT_TYPES
 from fasthtml.core import RedirectResponse
 import re
 import asyncio
 import time
 import urllib.parse
 from starlette.datastructures import UploadFile
-import base64
+from starlette.requests import Request
+import uuid
 from langchain.chat_models import init_chat_model
 from typing import Annotated, List, Any, cast
 from typing_extensions import TypedDict
@@ -35,7 +53,6 @@ from langchain_core.messages import (
     SystemMessage,
 )
 from typing import Annotated, Literal
-from langgraph.checkpoint.memory import MemorySaver
 from typing import Union
 
 
@@ -92,9 +109,13 @@ if not supabase_url or not supabase_anon_key:
 
 supabase: Client = create_client(supabase_url, supabase_anon_key)
 
-# --- Global Store for Pending Journal Updates ---
-pending_journal_updates: List[dict] = []
-pending_journal_updates_2: List[dict] = []
+# --- Per-Conversation Journal State and Pending Journal Updates ---
+# Both are keyed by the conversation thread ID (see get_conversation_thread_id) so users only see their own cards.
+# journal_store holds the current entries; journal_update_broker holds changes the UI has not rendered yet.
+journal_store = JournalStore()
+journal_update_broker = JournalUpdateBroker(
+    max_queue_size=int(os.getenv("AKASI_JOURNAL_QUEUE_SIZE", "50")),
+)
 
 # --- Global Chat History Store ---
 # CHAT_HISTORY removed - chat history now handled entirely client-side
@@ -293,36 +314,163 @@ body_scanner_action_commands_list = [
 
 
 
-async def process_files_to_base64_list(files: list[UploadFile]) -> list[dict]:
-    # (This function remains the same as provided in the previous correct answer)
-    # It takes a list of UploadFile objects, reads them, converts to Base64,
-    # and returns a list of dicts with filename, content_type, size, base64.
-    # Ensure it handles potential errors and closes files.
-    processed_attachments = []
-    if not files:
-        return processed_attachments
-    
-    for file_upload in files:
-        if file_upload and file_upload.filename and isinstance(file_upload, UploadFile):
-            try:
-                contents = await file_upload.read()
-                encoded_string = base64.b64encode(contents).decode('utf-8')
-                processed_attachments.append({
-                    "filename": file_upload.filename,
-                    "content_type": file_upload.content_type,
-                    "size": file_upload.size,
-                    "base64": encoded_string
-                })
-                await file_upload.close()
-            except Exception as e:
-                print(f"Error processing file {getattr(file_upload, 'filename', 'unknown')}: {e}")
-                processed_attachments.append({
-                    "filename": getattr(file_upload, 'filename', 'unknown_error_file'),
-                    "error": str(e)
-                })
+# Uploaded photos are downscaled/re-encoded before they are stored or sent to Bedrock
+image_normalizer = ImageNormalizer(
+    max_edge=int(os.getenv("AKASI_IMAGE_MAX_EDGE", "1568")),
+    output_format=os.getenv("AKASI_IMAGE_FORMAT", "JPEG"),
+    quality=int(os.getenv("AKASI_IMAGE_QUALITY", "85")),
+    max_workers=int(os.getenv("AKASI_IMAGE_WORKERS", "2")),
+)
+
+
+# Attachments are stored as raw bytes keyed by SHA-256; base64 is only produced when the Bedrock payload is built.
+# Blobs live in the AKASI_ATTACHMENT_BUCKET storage bucket so every worker sees them. The bucket is private: the
+# storage policies in supabase/migrations let the anon-key client in, or SUPABASE_SERVICE_ROLE_KEY_NEW is used when set.
+# AKASI_ATTACHMENT_BACKEND=local (tests / single-process development only) keeps them under AKASI_ATTACHMENT_DIR,
+# which must be outside the checkout.
+if os.getenv("AKASI_ATTACHMENT_BACKEND", "supabase").lower() == "local":
+    attachment_blob_backend = LocalDirectoryBackend(os.environ["AKASI_ATTACHMENT_DIR"])
+else:
+    supabase_service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY_NEW")
+    attachment_storage_client = create_client(supabase_url, supabase_service_role_key) if supabase_service_role_key else supabase
+    attachment_blob_backend = SupabaseStorageBackend(attachment_storage_client, os.getenv("AKASI_ATTACHMENT_BUCKET", "akasi-attachments"))
+# Uploads stay in memory briefly so the response request on the same worker does not reload them
+attachment_cache = AttachmentCache(
+    max_entries=int(os.getenv("AKASI_ATTACHMENT_CACHE_SIZE", "256")),
+    max_bytes=int(os.getenv("AKASI_ATTACHMENT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    ttl_seconds=float(os.getenv("AKASI_ATTACHMENT_CACHE_TTL_SECONDS", "120")),
+)
+attachment_store = AttachmentStore(attachment_blob_backend, supabase, cache=attachment_cache)
+
+
+# Image formats Bedrock accepts in an image block (checked after normalization)
+ALLOWED_ATTACHMENT_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+
+# Uploads are streamed in chunks with their type sniffed from magic bytes; oversized files/requests are refused early
+upload_reader = UploadReader(
+    accepted_content_types=ALLOWED_ATTACHMENT_CONTENT_TYPES | NORMALIZABLE_CONTENT_TYPES,
+    max_file_bytes=int(os.getenv("AKASI_UPLOAD_MAX_FILE_MB", "10")) * 1024 * 1024,
+    max_request_bytes=int(os.getenv("AKASI_UPLOAD_MAX_REQUEST_MB", "25")) * 1024 * 1024,
+)
+
+
+def read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def process_uploaded_file(file_upload: UploadFile, upload_budget) -> dict:
+    """
+    Streams, normalizes and validates one upload.
+    Returns a dict with filename, content_type, size and the raw bytes in "data", or with "error".
+    """
+    upload = None
+    try:
+        upload = await upload_reader.read(file_upload, upload_budget)
+        # The normalizer's worker process opens the temp file itself; only the (small) re-encoded image comes back
+        normalized = await image_normalizer.normalize_file(upload["path"], upload["content_type"])
+        content_type = normalized["content_type"] or upload["content_type"]
+        if content_type not in ALLOWED_ATTACHMENT_CONTENT_TYPES:
+            # e.g. HEIC that could not be converted: a rejection, not an accepted upload
+            upload_reader.reject_after_read(upload, upload_budget, "unsupported_type")
+            raise ValueError(f"Unsupported file type: {content_type}")
+        if normalized["normalized"]:
+            log_step("image normalization", f"{file_upload.filename}: {normalized['original_size']} -> {normalized['normalized_size']} bytes")
+            data = normalized["data"]
+        else:
+            data = await asyncio.to_thread(read_file_bytes, upload["path"])
+        processed_attachment = {
+            "filename": file_upload.filename,
+            "content_type": content_type,
+            "size": upload["size"],
+            "original_size": normalized["original_size"],
+            "normalized_size": normalized["normalized_size"],
+            "data": data,
+        }
+        if not normalized["normalized"]:
+            # Bytes are unchanged, so the hash computed while streaming is the blob key
+            processed_attachment["sha256"] = upload["sha256"]
+        return processed_attachment
+    except Exception as e:
+        print(f"Error processing file {getattr(file_upload, 'filename', 'unknown')}: {e}")
+        return {
+            "filename": getattr(file_upload, 'filename', 'unknown_error_file'),
+            "error": str(e)
+        }
+    finally:
+        if upload is not None:
+            os.remove(upload["path"])
+        await file_upload.close()
+
+
+async def read_upload_form(req):
+    """
+    Parses a chat form with uploads while counting the raw body, so an oversized request is
+    refused mid-stream rather than after Starlette has buffered all of it (chunked requests
+    send no Content-Length). Raises UploadRejected.
+    """
+    upload_reader.check_content_length(req.headers.get("content-length"))
+    limited_request = Request(req.scope, upload_reader.limit_receive(req.receive))
+    return await limited_request.form()
+
+
+async def process_uploaded_files(files: list[UploadFile]) -> list[dict]:
+    """
+    Reads and validates all uploads concurrently, keeping their order.
+    All files share one per-request size budget.
+    """
+    upload_budget = upload_reader.new_budget()
+    valid_uploads = []
+    for file_upload in files or []:
+        if file_upload and isinstance(file_upload, UploadFile) and file_upload.filename:
+            valid_uploads.append(file_upload)
         else:
             print(f"Skipping invalid file object: {file_upload}") # Log if not an UploadFile
-    return processed_attachments
+    return list(await asyncio.gather(*(process_uploaded_file(file_upload, upload_budget) for file_upload in valid_uploads)))
+
+
+async def ingest_uploaded_files(files: list[UploadFile], conversation_id: Optional[str] = None) -> tuple[list[dict], list[str]]:
+    """
+    Upload pipeline shared by the chat routes: concurrent reads and validation,
+    then every valid attachment stored with a single bulk metadata insert.
+    'conversation_id' is recorded on the rows so the attachment garbage collector can tell which conversation they belong to.
+
+    Returns:
+        (processed attachments for previews, including failed ones with "error"; stored attachment UUIDs in upload order)
+    """
+    processed_attachments = await process_uploaded_files(files)
+    storable_attachments = [att_data for att_data in processed_attachments if "error" not in att_data]
+    for att_data in processed_attachments:
+        if "error" in att_data:
+            log_step("file skip", f"Skipping {att_data.get('filename', 'N/A')}: {att_data['error']}")
+    if not storable_attachments:
+        return processed_attachments, []
+
+    try:
+        stored_attachments = await attachment_store.aput_many(
+            [{**att_data, "conversation_id": conversation_id} for att_data in storable_attachments]
+        )
+    except Exception as e:
+        log_error("attachment store", e)
+        # Report the failure on the previews instead of silently dropping the attachments
+        failed_attachments = [
+            att_data if "error" in att_data else {**att_data, "error": "Could not store the attachment. Please try again."}
+            for att_data in processed_attachments
+        ]
+        return failed_attachments, []
+    log_step("attachment store", f"Stored {len(stored_attachments)} attachments in one insert", {**attachment_store.stats(), "uploads": upload_reader.metrics.stats()})
+    return processed_attachments, [stored_attachment["id"] for stored_attachment in stored_attachments]
+
+
+async def mark_attachments_consumed(attachments: list[dict]) -> None:
+    """Marks a turn's attachments consumed once it has been answered; the garbage collector deletes them after the retention period."""
+    if not attachments:
+        return
+    try:
+        marked = await attachment_store.amark_consumed([attachment["id"] for attachment in attachments])
+        log_step("attachment gc", f"Marked {marked} attachments consumed")
+    except Exception as e:
+        log_error("attachment mark consumed", e)
 
 
 # --- 🟣🟣🟣🟣 BUILDING THE LLM AGENT 1 🟣🟣🟣🟣 --- 
@@ -336,25 +484,46 @@ model_claude_3_7_sonnet = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
 model_claude_4_sonnet = "us.anthropic.claude-sonnet-4-20250514-v1:0"
 model_claude_4_opus = "us.anthropic.claude-opus-4-20250514-v1:0"
 
-# --- LLM Configuration with Extended Thinking Control ---
-
-llm = init_chat_model(
-    model_2_claude_3_5_sonnet_v2,
-    model_provider="bedrock_converse",
-    region_name='us-west-2',
-    temperature=0.1,
-    max_tokens=200  # Reduced limit for concise wellness journal responses
-)
+# --- LLM Configuration: one model per graph node ---
+# Override per node with AKASI_MODEL_<NODE>[_MAX_TOKENS|_TEMPERATURE|_FALLBACK] or a JSON file in AKASI_MODEL_CONFIG,
+# e.g. AKASI_MODEL_SCANNER=haiku AKASI_MODEL_JOURNAL=haiku for the classification-style workflows
+
+model_aliases = {
+    "haiku": model_1_claude_haiku,
+    "sonnet-3.5": model_2_claude_3_5_sonnet,
+    "sonnet-3.5-v2": model_2_claude_3_5_sonnet_v2,
+    "sonnet-3.7": model_claude_3_7_sonnet,
+    "sonnet-4": model_claude_4_sonnet,
+    "opus-4": model_claude_4_opus,
+}
+
+
+def build_bedrock_chat_model(model_id: str, max_tokens: Optional[int] = None, temperature: Optional[float] = None):
+    return init_chat_model(
+        model_id,
+        model_provider="bedrock_converse",
+        region_name='us-west-2',
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
 
 
-# Dedicated LLM for image processing to avoid Claude 4's extended thinking overhead
-llm_for_image = init_chat_model(
-    model_2_claude_3_5_sonnet_v2,
-    model_provider="bedrock_converse",
-    region_name='us-west-2',
-    temperature=0.1,
-    max_tokens=3000  # Sufficient for image analysis
+model_registry = ModelRegistry(
+    defaults={
+        # Reduced limit for concise responses
+        "agent": {"model": model_2_claude_3_5_sonnet_v2, "max_tokens": 200, "temperature": 0.1, "fallback_model": model_1_claude_haiku},
+        # Fused turn mode: reply + scanner command + journal operation in one response
+        "fused": {"model": model_2_claude_3_5_sonnet_v2, "max_tokens": 600, "temperature": 0.1, "fallback_model": model_1_claude_haiku},
+        # Dedicated model for image processing to avoid Claude 4's extended thinking overhead
+        "image_tool": {"model": model_2_claude_3_5_sonnet_v2, "max_tokens": 3000, "temperature": 0.1, "fallback_model": model_1_claude_haiku},
+        "scanner": {"model": model_2_claude_3_5_sonnet_v2, "max_tokens": 200, "temperature": 0.1, "fallback_model": model_1_claude_haiku},
+        "journal": {"model": model_2_claude_3_5_sonnet_v2, "max_tokens": 200, "temperature": 0.1, "fallback_model": model_1_claude_haiku},
+        "summary": {"model": model_2_claude_3_5_sonnet_v2, "max_tokens": 200, "temperature": 0.1, "fallback_model": model_1_claude_haiku},
+    },
+    client_factory=build_bedrock_chat_model,
+    aliases=model_aliases,
 )
+log_step("model registry", "Resolved per-node models", model_registry.describe())
 
 
 
@@ -362,23 +531,103 @@ class MedicalAgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
     input_base64_images: Optional[List[dict]]
     body_scanner_command: str | None
+    # Rolling summary of older turns and how many leading messages it covers
+    conversation_summary: Optional[str]
+    summarized_message_count: Optional[int]
+    # Conversation key for per-user stores (journal queues); set on the secondary workflows
+    thread_id: Optional[str]
+    # Fused turn mode: scanner command and journal operation returned with the reply (None otherwise)
+    fused_turn: Optional[dict]
+    # Tool loop budget for the current turn (reset by llm_agent_1)
+    tool_round_trips: Optional[int]
+    turn_started_at: Optional[float]
+
+
+# --- Context Budgets ---
+async def summarize_conversation_for_context(previous_summary: str, transcript: str) -> str:
+    """
+    Folds a transcript of older turns into the rolling conversation summary.
+    """
+    response = await model_registry.chat("summary").ainvoke([
+        SystemMessage(content=CONTEXT_SUMMARY_SYSTEM_MESSAGE_CONTENT),
+        HumanMessage(content=f"Previous summary:\n{previous_summary or '(none)'}\n\nNewer turns to fold in:\n{transcript}"),
+    ])
+    return str(response.content).strip()
+
+
+context_manager = ContextManager(summarize=summarize_conversation_for_context, keep_recent_turns=6)
+
+# Each node only pays for the history it actually needs
+agent_context_policy = ContextPolicy("decide_action_node", token_budget=6000, recent_turns=6, include_summary=True)
+scanner_context_policy = ContextPolicy("body_scanner_commands", token_budget=1500, recent_turns=2, include_summary=False)
+journal_context_policy = ContextPolicy("wellness_journal_entry_generator_node", token_budget=4000, recent_turns=4, include_summary=True)
 
 
 graph_builder = StateGraph(MedicalAgentState)
 
-memory = MemorySaver()
+# Summaries of previously seen images (set AKASI_IMAGE_SUMMARY_CACHE_DIR to persist them across restarts)
+image_summary_cache = ImageSummaryCache(
+    max_entries=int(os.getenv("AKASI_IMAGE_SUMMARY_CACHE_SIZE", "1024")),
+    disk_dir=os.getenv("AKASI_IMAGE_SUMMARY_CACHE_DIR") or None,
+)
+
+# AKASI_CHECKPOINT_DB points at a SQLite file so conversations survive restarts.
+# Without it, per-thread conversations stay in memory and are evicted by TTL/LRU so the heap stays bounded.
+checkpoint_db_path = os.getenv("AKASI_CHECKPOINT_DB")
+if checkpoint_db_path:
+    memory = SqliteCheckpointSaver(checkpoint_db_path, pool_size=int(os.getenv("AKASI_CHECKPOINT_DB_POOL_SIZE", "4")))
+    # Compaction runs from the leased sweeper (see llm_agent_1), not in every worker at import
+    log_step("checkpointer", f"Using SQLite checkpoints at {checkpoint_db_path}")
+else:
+    memory = BoundedMemorySaver(
+        max_threads=int(os.getenv("AKASI_CHECKPOINT_MAX_THREADS", "500")),
+        ttl_seconds=float(os.getenv("AKASI_CHECKPOINT_TTL_SECONDS", "3600")),
+        max_bytes=int(os.getenv("AKASI_CHECKPOINT_MAX_MB", "256")) * 1024 * 1024,
+        # Retention: only the latest snapshots per thread, optionally storing message deltas instead of full copies
+        keep_latest=int(os.getenv("AKASI_CHECKPOINT_KEEP_LATEST", "3")) or None,
+        store_message_deltas=os.getenv("AKASI_CHECKPOINT_MESSAGE_DELTAS", "0").lower() in ("1", "true", "yes"),
+    )
 
-# Tool definition
-@tool
-def summarize_medical_images_tool_interface(images: List[dict]) -> str:
+
+def conversation_still_holds_images(conversation_id: str) -> bool:
+    """True while the conversation's latest checkpoint still carries base64 images (an unfinished turn)."""
+    # MemorySaver.storage is a defaultdict: looking up an evicted thread would re-create an untracked entry
+    if isinstance(memory, BoundedMemorySaver) and conversation_id not in memory.storage:
+        return False
+    try:
+        checkpoint_tuple = memory.get_tuple(cast(Any, {"configurable": {"thread_id": conversation_id}}))
+    except Exception as e:
+        log_error("attachment gc checkpoint lookup", e)
+        return True  # Keep the rows if we cannot tell
+    if checkpoint_tuple is None:
+        return False
+    return bool(checkpoint_tuple.checkpoint.get("channel_values", {}).get("input_base64_images"))
+
+
+# Consumed attachments are deleted after AKASI_ATTACHMENT_RETENTION_SECONDS, never-consumed uploads after
+# AKASI_ATTACHMENT_ORPHAN_SECONDS; every AKASI_ATTACHMENT_GC_SECONDS at most AKASI_ATTACHMENT_GC_BATCH rows are swept.
+attachment_gc_enabled = os.getenv("AKASI_ATTACHMENT_GC", "1").lower() in ("1", "true", "yes")
+attachment_gc = AttachmentGarbageCollector(
+    attachment_store,
+    retention_seconds=float(os.getenv("AKASI_ATTACHMENT_RETENTION_SECONDS", "3600")),
+    orphan_seconds=float(os.getenv("AKASI_ATTACHMENT_ORPHAN_SECONDS", "86400")),
+    batch_size=int(os.getenv("AKASI_ATTACHMENT_GC_BATCH", "1000")),
+    chunk_size=int(os.getenv("AKASI_ATTACHMENT_GC_CHUNK", "100")),
+    is_protected=conversation_still_holds_images,
+    defer_seconds=float(os.getenv("AKASI_ATTACHMENT_GC_DEFER_SECONDS", "3600")),
+    blob_grace_seconds=float(os.getenv("AKASI_ATTACHMENT_BLOB_GRACE_SECONDS", "600")),
+)
+
+# Several images are summarized one by one in parallel and then merged (AKASI_IMAGE_MAP_REDUCE=0 sends them in one call)
+image_map_reduce_enabled = os.getenv("AKASI_IMAGE_MAP_REDUCE", "1").lower() in ("1", "true", "yes")
+image_map_semaphore = asyncio.Semaphore(int(os.getenv("AKASI_IMAGE_MAP_CONCURRENCY", "4")))
+
+
+async def summarize_images_in_one_call(images: List[dict]) -> str:
     """
-    Analyzes and summarizes a list of provided medical images (e.g., X-rays, MRIs)
-    by making an internal LLM call. 
+    Summarizes the given images with a single multimodal LLM call.
+    Raises ValueError if no image has data and RuntimeError if the model returns no summary.
     """
-    if not images:
-        return "Error: No images were provided to summarize."
-    
-
     # 1. Construct the multimodal message content parts for the internal LLM call
     message_content_parts = []
     for image_detail_dict in images:
@@ -397,23 +646,16 @@ def summarize_medical_images_tool_interface(images: List[dict]) -> str:
                 "data": b64_image_data,
             },
         })
-    
 
     if not message_content_parts:
-        return "Error: No valid image data found to summarize after processing input."
-
-
+        raise ValueError("No valid image data found to summarize after processing input.")
 
-    
     summarization_prompt_text = (
         "Based on the following medical image(s), provide a concise summary or medical report. "
         "Focus on observable features and avoid making diagnoses if not explicitly qualified to do so."
     )
-
     message_content_parts.append({"type": "text", "text": summarization_prompt_text})
 
-    
-
     # 2. Create the System and Human messages for the LLM call
     summarization_system_prompt = SystemMessage(
         content=(
@@ -424,17 +666,84 @@ def summarize_medical_images_tool_interface(images: List[dict]) -> str:
     )
     summarization_human_message = HumanMessage(content=message_content_parts)
 
+    log_step("image analysis", f"Processing {len(message_content_parts) -1} medical image(s) using {model_registry.specs['image_tool']['model']}")
+    response = await model_registry.chat("image_tool").ainvoke([summarization_system_prompt, summarization_human_message])
+
+    if isinstance(response, AIMessage) and response.content:
+        return str(response.content)
+    raise RuntimeError(f"Unexpected response type: {type(response)}")
+
+
+async def summarize_single_image(image: dict) -> str:
+    """
+    Map step: one image's summary, from the per-image cache or a concurrency-limited LLM call.
+    """
+    cache_key = image_set_key([image])
+    cached_summary = image_summary_cache.get(cache_key)
+    if cached_summary:
+        return cached_summary
+    async with image_map_semaphore:
+        summary = await summarize_images_in_one_call([image])
+    image_summary_cache.put(cache_key, summary)
+    return summary
+
+
+async def merge_image_summaries(summaries: List[str]) -> str:
+    """
+    Reduce step: combines per-image summaries into one report.
+    Falls back to the numbered per-image summaries if the merge call fails.
+    """
+    numbered_summaries = "\n\n".join(f"Image {index}: {summary}" for index, summary in enumerate(summaries, start=1))
     try:
-        log_step("image analysis", f"Processing {len(message_content_parts) -1} medical image(s) using Claude 3.7")
-        
-        response = llm_for_image.invoke([summarization_system_prompt, summarization_human_message])
-        
+        response = await model_registry.chat("image_tool").ainvoke([
+            SystemMessage(content=(
+                "You are an expert medical image analyst. Combine the following per-image reports, which belong to "
+                "the same patient upload, into one concise summary or medical report. Keep every observable finding, "
+                "note which image it comes from when that matters, and avoid making diagnoses."
+            )),
+            HumanMessage(content=numbered_summaries),
+        ])
         if isinstance(response, AIMessage) and response.content:
-            log_success("image analysis", f"Generated summary: {len(response.content)} characters")
             return str(response.content)
+    except Exception as e:
+        log_error("image summary merge", e)
+    return numbered_summaries
+
+
+# Tool definition
+@tool
+async def summarize_medical_images_tool_interface(images: List[dict]) -> str:
+    """
+    Analyzes and summarizes a list of provided medical images (e.g., X-rays, MRIs)
+    by making an internal LLM call. 
+    """
+    if not images:
+        return "Error: No images were provided to summarize."
+
+    # Same image bytes (or the same set of images) -> reuse the previous summary
+    cache_key = image_set_key(images)
+    cached_summary = image_summary_cache.get(cache_key)
+    if cached_summary:
+        log_success("image analysis", f"Summary cache hit {cache_key[:12]} ({image_summary_cache.stats()})")
+        return cached_summary
+
+    valid_images = [image for image in images if image.get("data")]
+    if not valid_images:
+        return "Error: No valid image data found to summarize after processing input."
+
+    try:
+        if image_map_reduce_enabled and len(valid_images) > 1:
+            # Map: every image concurrently (bounded by the semaphore); reduce: one short text-only merge call
+            started_at = time.perf_counter()
+            per_image_summaries = await asyncio.gather(*(summarize_single_image(image) for image in valid_images))
+            summary = await merge_image_summaries(per_image_summaries)
+            log_step("image analysis", f"Map-reduce over {len(valid_images)} images in {time.perf_counter() - started_at:.2f}s")
         else:
-            log_error("image analysis", Exception(f"Unexpected response type: {type(response)}"))
-            return "Error: Could not generate a summary from the LLM within the tool."
+            summary = await summarize_images_in_one_call(valid_images)
+
+        log_success("image analysis", f"Generated summary: {len(summary)} characters")
+        image_summary_cache.put(cache_key, summary)
+        return summary
             
     except Exception as e:
         log_error("image analysis", e)
@@ -443,87 +752,194 @@ def summarize_medical_images_tool_interface(images: List[dict]) -> str:
 
 tools = [summarize_medical_images_tool_interface]
 tools_by_name = {tool.name: tool for tool in tools}
-llm_with_tools = llm.bind_tools(tools)
+llm_with_tools = model_registry.with_tools("agent", tools)
 
 
 # --- Node Functions ---
-def decide_action_node(state: MedicalAgentState):
+async def decide_action_node(state: MedicalAgentState):
     """
     The LLM decides whether to respond directly or call a tool.
     """
     log_step("llm decision node", f"Processing {len(state['messages'])} messages")
     
-    akasi_system_message = SystemMessage(content=AKASI_SYSTEM_MESSAGE_CONTENT)
-    messages_for_llm_invocation = [akasi_system_message] + state["messages"]
+    # Only the current turn keeps its base64 images, and only until the image tool has summarized them;
+    # earlier turns (and this one, once its summary is in the state) carry a reference + summary instead
+    history = strip_images_from_history(state["messages"], keep_latest_turn=True, summary_lookup=image_summary_cache.lookup_for_hashes)
+
+    # The rolling summary is folded in the background after a reply; pick up a finished fold without waiting
+    fold_key = state.get("thread_id") or "anonymous"
+    conversation_summary, summarized_message_count = context_manager.take_fold(
+        fold_key, state.get("conversation_summary"), state.get("summarized_message_count")
+    )
+    messages_for_llm_invocation = context_manager.assemble(
+        history, agent_context_policy, AKASI_SYSTEM_MESSAGE_CONTENT, conversation_summary, summarized_message_count
+    )
     
-    log_step("llm invocation", f"Message types: {[m.type for m in messages_for_llm_invocation]}")
+    log_step("llm invocation", f"Message types: {[m.type for m in messages_for_llm_invocation]}, ~{context_manager.last_token_counts[agent_context_policy.name]} tokens")
     
-    # Invoke the LLM with the Akasi persona and the rest of the conversation history
-    response = llm_with_tools.invoke(messages_for_llm_invocation)
+    # Fused mode answers with reply + scanner command + journal operation in one call once no image tool call is pending
+    fused_turn = None
+    images_awaiting_tool = bool(state.get("input_base64_images")) and isinstance(state["messages"][-1], HumanMessage)
+    if fused_turn_mode and not images_awaiting_tool:
+        fused_result = await invoke_fused_turn(messages_for_llm_invocation, state.get("thread_id"))
+        if fused_result is not None:
+            response = AIMessage(content=fused_result.reply)
+            fused_turn = {
+                "body_scanner_command": fused_result.body_scanner_command,
+                "wellness_journal_operation": fused_result.wellness_journal_operation.model_dump() if fused_result.wellness_journal_operation else None,
+            }
+
+    if fused_turn is None:
+        # Invoke the LLM with the Akasi persona and the rest of the conversation history
+        response = await llm_with_tools.ainvoke(messages_for_llm_invocation)
     
     has_tools = getattr(response, 'tool_calls', None)
     log_success("llm decision", f"Response type: {response.type}, Tool calls: {'Yes' if has_tools else 'No'}")
     
     # The response (AIMessage) will be added to the state's message list by LangGraph's `add_messages`
-    return {"messages": [response]}
+    state_updates = {
+        "messages": [response],
+        "conversation_summary": conversation_summary,
+        "summarized_message_count": summarized_message_count,
+    }
+
+    if not has_tools:
+        # Turn is finished: replace image-bearing messages (same id) so checkpoints and later calls drop the base64 data
+        image_free_messages = image_free_replacements(state["messages"], summary_lookup=image_summary_cache.lookup_for_hashes)
+        if image_free_messages:
+            log_step("image stripping", f"Replaced images in {len(image_free_messages)} message(s) with references")
+        state_updates["messages"] = image_free_messages + [response]
+        state_updates["input_base64_images"] = None
+        context_manager.schedule_fold(fold_key, history + [response], conversation_summary, summarized_message_count)
+        state_updates["fused_turn"] = fused_turn
+
+    return state_updates
+
+
+# Per-turn tool loop limits: each tool call gets a timeout, and a turn gets a bounded number of
+# decide -> tool round trips and a wall-clock budget before it is forced to a final answer
+tool_timeout_seconds = float(os.getenv("AKASI_TOOL_TIMEOUT_SECONDS", "60"))
+max_tool_round_trips = int(os.getenv("AKASI_MAX_TOOL_ROUND_TRIPS", "3"))
+turn_budget_seconds = float(os.getenv("AKASI_TURN_BUDGET_SECONDS", "90"))
+tool_loop_metrics = {"tool_calls": 0, "tool_timeouts": 0, "round_trips": 0, "budget_exhausted": 0}
+
+TOOL_BUDGET_EXHAUSTED_MESSAGE = (
+    "I wasn't able to finish analyzing everything in time for this message. "
+    "Here is what I can share so far; feel free to send your question or images again."
+)
+
 
+async def run_tool_call(tool_call: dict, state: MedicalAgentState) -> ToolMessage:
+    """
+    Executes a single tool call with the per-tool timeout and returns its ToolMessage.
+    """
+    tool_name = tool_call["name"]
+    invoked_tool = tools_by_name.get(tool_name)
+
+    print(f"Attempting to execute tool: {tool_name}")
+
+    if not invoked_tool:
+        observation = f"Error: Unknown tool '{tool_name}' called."
+    else:
+        if tool_name == "summarize_medical_images_tool_interface":
+            # This will be a List[dict] as per MedicalAgentState
+            images_data_list_from_state = state.get("input_base64_images")
+            tool_args_for_invoke = {"images": images_data_list_from_state} if images_data_list_from_state else None
+        else:
+            tool_args_for_invoke = tool_call.get("args", {})
+
+        if tool_args_for_invoke is None:
+            observation = "Error: Tool 'summarize_medical_images_tool_interface' called, but no image data was found in the state."
+        else:
+            tool_loop_metrics["tool_calls"] += 1
+            try:
+                print(f"Invoking '{tool_name}' (timeout {tool_timeout_seconds:.0f}s)")
+                observation = await asyncio.wait_for(invoked_tool.ainvoke(tool_args_for_invoke), timeout=tool_timeout_seconds)
+            except asyncio.TimeoutError:
+                tool_loop_metrics["tool_timeouts"] += 1
+                observation = f"Error: {tool_name} did not finish within {tool_timeout_seconds:.0f} seconds."
+                print(f"Tool '{tool_name}' timed out")
+            except Exception as e:
+                observation = f"Error invoking {tool_name}: {str(e)}"
+                print(f"Exception during tool invocation: {e}")
 
-def execute_tool_node(state: MedicalAgentState):
+    return ToolMessage(content=str(observation), tool_call_id=tool_call["id"], name=tool_name)
+
+
+async def execute_tool_node(state: MedicalAgentState):
     """
-    Executes the tool called by the LLM.
+    Executes the tools called by the LLM concurrently.
     """
     print("\n--- Entered execute_tool_node ---")
-    tool_messages: List[ToolMessage] = []
     last_message = state["messages"][-1]
 
     if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
         print("No tool calls found in the last AI message.")
         return {} 
 
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call["name"]
-        invoked_tool = tools_by_name.get(tool_name)
+    tool_messages: List[ToolMessage] = list(await asyncio.gather(
+        *(run_tool_call(tool_call, state) for tool_call in last_message.tool_calls)
+    ))
+    tool_loop_metrics["round_trips"] += 1
 
-        print(f"Attempting to execute tool: {tool_name}")
-
-        if not invoked_tool:
-            observation = f"Error: Unknown tool '{tool_name}' called."
-        elif tool_name == "summarize_medical_images_tool_interface":
-            # This will be a List[dict] as per MedicalAgentState
-            images_data_list_from_state = state.get("input_base64_images") 
-            if images_data_list_from_state:
-
-                tool_args_for_invoke = {"images": images_data_list_from_state}
-                try:
-                    print(f"Invoking '{tool_name}' with {len(images_data_list_from_state)} image items from state.")
-                    observation = invoked_tool.invoke(tool_args_for_invoke)
-                except Exception as e:
-                    observation = f"Error invoking {tool_name}: {str(e)}"
-                    print(f"Exception during tool invocation: {e}")
-            else:
-                observation = "Error: Tool 'summarize_medical_images_tool_interface' called, but no image data was found in the state."
-        else:
-            try:
-                print(f"Invoking generic tool '{tool_name}' with args: {tool_call.get('args', {})}")
-                observation = invoked_tool.invoke(tool_call.get("args", {}))
-            except Exception as e:
-                observation = f"Error invoking {tool_name}: {str(e)}"
-                print(f"Exception during generic tool invocation: {e}")
-        
-        tool_messages.append(
-            ToolMessage(content=str(observation), tool_call_id=tool_call["id"], name=tool_name)
-        )
     print(f"Tool observation(s): {[str(tm.content)[:100] + '...' if tm.content else 'N/A' for tm in tool_messages]}")
-    return {"messages": tool_messages}
+    return {"messages": tool_messages, "tool_round_trips": (state.get("tool_round_trips") or 0) + 1}
+
+
+def tool_budget_exhausted(state: MedicalAgentState) -> bool:
+    """True once the turn has used its tool round trips or its wall-clock budget."""
+    if (state.get("tool_round_trips") or 0) >= max_tool_round_trips:
+        return True
+    turn_started_at = state.get("turn_started_at")
+    return bool(turn_started_at) and time.time() - turn_started_at >= turn_budget_seconds
+
+
+async def finalize_turn_node(state: MedicalAgentState):
+    """
+    Ends a turn whose tool budget is exhausted: answers the pending tool calls with a
+    budget notice and produces a final reply without further tool calls.
+    """
+    tool_loop_metrics["budget_exhausted"] += 1
+    log_step("tool budget", f"Round trips: {state.get('tool_round_trips') or 0}, forcing final answer", tool_loop_metrics)
+
+    last_message = state["messages"][-1]
+    budget_notices = [
+        ToolMessage(content="Error: The tool budget for this turn is exhausted. Answer with the information already available.", tool_call_id=tool_call["id"], name=tool_call["name"])
+        for tool_call in last_message.tool_calls
+    ]
+
+    final_reply = ""
+    history = strip_images_from_history(list(state["messages"]) + budget_notices, keep_latest_turn=True, summary_lookup=image_summary_cache.lookup_for_hashes)
+    messages_for_llm_invocation = context_manager.assemble(
+        history, agent_context_policy, AKASI_SYSTEM_MESSAGE_CONTENT, state.get("conversation_summary"), state.get("summarized_message_count")
+    )
+    try:
+        response = await llm_with_tools.ainvoke(messages_for_llm_invocation)
+        # Any further tool calls are dropped; only the text part is kept
+        final_reply = message_text(response).strip()
+    except Exception as e:
+        log_error("tool budget final answer", e)
+
+    image_free_messages = image_free_replacements(state["messages"], summary_lookup=image_summary_cache.lookup_for_hashes)
+    return {
+        "messages": image_free_messages + budget_notices + [AIMessage(content=final_reply or TOOL_BUDGET_EXHAUSTED_MESSAGE)],
+        "input_base64_images": None,
+        "fused_turn": None,
+    }
+
 
 # --- Conditional Edge Logic ---
 def should_call_tool(state: MedicalAgentState):
     """
-    Determines the next step based on whether the LLM decided to call a tool.
+    Determines the next step based on whether the LLM decided to call a tool
+    and whether the turn still has tool budget left.
     """
     print("\n--- Entered should_call_tool ---")
     last_message = state["messages"][-1]
     if isinstance(last_message, AIMessage) and last_message.tool_calls:
+        if tool_budget_exhausted(state):
+            print("Tool budget exhausted, routing to finalize_turn_node")
+            return "finalize_turn_node"
         print("Routing to execute_tool_node")
         return "execute_tool_node"
     print("Routing to END (or final response generation)")
@@ -535,6 +951,7 @@ graph_builder = StateGraph(MedicalAgentState)
 
 graph_builder.add_node("decide_action_node", decide_action_node)
 graph_builder.add_node("execute_tool_node", execute_tool_node)
+graph_builder.add_node("finalize_turn_node", finalize_turn_node)
 
 graph_builder.set_entry_point("decide_action_node")
 
@@ -543,11 +960,13 @@ graph_builder.add_conditional_edges(
     should_call_tool,
     {
         "execute_tool_node": "execute_tool_node",
+        "finalize_turn_node": "finalize_turn_node",
         END: END,
     },
 )
 
 graph_builder.add_edge("execute_tool_node", "decide_action_node")
+graph_builder.add_edge("finalize_turn_node", END)
 
 graph_1 = graph_builder.compile(checkpointer=memory)
 
@@ -560,12 +979,15 @@ from pydantic import BaseModel, Field
 
 graph_builder_2 = StateGraph(MedicalAgentState)
 
+BodyScannerCommandName = Literal["START_SCAN", "STOP_SCAN", "Head", "Neck", "Thorax", "Lungs", "Heart", "idle", "Abdominal and Pelvic Region", "Left Shoulder", "Right Shoulder", "Left Arm", "Right Arm", "Left Hand", "Right Hand", "Left Leg", "Right Leg", "Left Foot", "Right Foot", "FULL_BODY_GLOW"]
+
+
 class BodyScannerCommand(BaseModel):
     """
     Represents the command to be sent to the body scanner animation system
     based on the ongoing conversation with the patient.
     """
-    body_scanner_command: Literal["START_SCAN", "STOP_SCAN", "Head", "Neck", "Thorax", "Lungs", "Heart", "idle", "Abdominal and Pelvic Region", "Left Shoulder", "Right Shoulder", "Left Arm", "Right Arm", "Left Hand", "Right Hand", "Left Leg", "Right Leg", "Left Foot", "Right Foot", "FULL_BODY_GLOW"] = Field(
+    body_scanner_command: BodyScannerCommandName = Field(
         ...,
         description="The chosen command for the body scanner animation. Must be one of the predefined commands."
     )
@@ -573,38 +995,52 @@ class BodyScannerCommand(BaseModel):
 
 
 
-def body_scanner_commands(state: MedicalAgentState):
+scanner_command_cache = ScannerCommandCache(
+    last_k=int(os.getenv("AKASI_SCANNER_CACHE_LAST_K", "2")),
+    max_entries=int(os.getenv("AKASI_SCANNER_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("AKASI_SCANNER_CACHE_TTL_SECONDS", "300")),
+)
+
+# Lexicon-based fast path; set AKASI_SCANNER_RESOLVER_THRESHOLD above 1 to always ask the LLM
+body_region_resolver = BodyRegionResolver(threshold=float(os.getenv("AKASI_SCANNER_RESOLVER_THRESHOLD", "0.6")))
+
+
+async def body_scanner_commands(state: MedicalAgentState):
     log_step("body scanner commander", f"Analyzing {len(state['messages'])} messages")
     conversation_history = state["messages"]
     if not conversation_history:
         log_step("body scanner fallback", "No conversation history, using idle command")
         return {"body_scanner_command": "idle"} # Default command
 
+    resolution = body_region_resolver.resolve(conversation_history)
+    if not resolution["use_llm"]:
+        log_success("body scanner command", f"Resolved locally: {resolution['command']} ({resolution['confidence']})")
+        return {"body_scanner_command": resolution["command"]}
+
     # Ensure the LLM used here supports ainvoke and structured output
-    body_scanner_commander_llm = llm.with_structured_output(BodyScannerCommand)
+    body_scanner_commander_llm = model_registry.structured("scanner", BodyScannerCommand)
     
-    system_prompt_content = BODY_SCANNER_SYSTEM_MESSAGE_CONTENT
-
-    # Prepare messages for the commander LLM
-    messages_for_commander_llm: List[BaseMessage] = [
-        SystemMessage(content=system_prompt_content)
-    ]
-    # Append existing history (which are already BaseMessage objects)
-    messages_for_commander_llm.extend(conversation_history)
+    # Prepare messages for the commander LLM (system prompt + the last few turns only)
+    messages_for_commander_llm: List[BaseMessage] = context_manager.assemble(
+        conversation_history, scanner_context_policy, BODY_SCANNER_SYSTEM_MESSAGE_CONTENT
+    )
     messages_for_commander_llm.append(
          HumanMessage(content="Based on the full conversation history provided, what is the single most appropriate body scanner command?")
     )
+    log_step("scanner context", f"~{context_manager.last_token_counts[scanner_context_policy.name]} tokens")
     
     try:
-        result = body_scanner_commander_llm.invoke(messages_for_commander_llm)
+        result = await body_scanner_commander_llm.ainvoke(messages_for_commander_llm)
         
         # Fix: Access the Pydantic model field directly
         if result and isinstance(result, BodyScannerCommand):
             command_to_set = result.body_scanner_command
         else:
             command_to_set = "idle"
-            
+
+        body_region_resolver.record_fallback(resolution, command_to_set)
         log_success("body scanner command", f"Selected: {command_to_set}")
+        log_step("body region resolver", "LLM fallback", body_region_resolver.stats())
         return {"body_scanner_command": command_to_set}
     except Exception as e:
         log_error("body scanner commander", e)
@@ -643,9 +1079,9 @@ class WellnessJournalOperation(BaseModel):
     wellness_journal_entry_id: str = Field(
         ...,
         description=(
-            "The unique identifier for the wellness journal entry. "
-            "For 'ADD' operations, this should be a new, unique ID (e.g., if existing IDs are '1', '2', a new one could be '3'; if no entries exist, start with '1'). "
-            "For 'UPDATE' or 'REMOVE' operations, this MUST exactly match the ID of an existing entry from the provided list."
+            "The identifier of the wellness journal entry. "
+            "For 'ADD' operations, use 'NEW'; the server assigns the ID. "
+            "For 'UPDATE' or 'REMOVE' operations, this MUST exactly match the id of an existing entry from the provided table."
         )
     )
 
@@ -709,7 +1145,7 @@ graph_builder_3 = StateGraph(Workflow2State)
 
 
 
-def wellness_journal_entry_generator_node(state: Workflow2State):
+async def wellness_journal_entry_generator_node(state: Workflow2State):
     log_step("wellness journal generator", f"Processing conversation with {len(state['messages'])} messages")
     log_step("current date", current_date_manila_iso)
 
@@ -717,28 +1153,30 @@ def wellness_journal_entry_generator_node(state: Workflow2State):
     existing_entries_str = state.get("existing_journal_entries_json_string", "[]") 
 
     # Ensure the LLM used here supports ainvoke and structured output
-    wellness_journal_llm = llm.with_structured_output(WellnessJournalOperation)
-
-    try:
-        current_pending_updates_str = json.dumps(pending_journal_updates)
-    except TypeError as e:
-        log_error("journal serialization", e)
-        current_pending_updates_str = "[]"
+    wellness_journal_llm = model_registry.structured("journal", WellnessJournalOperation)
 
     if not conversation_history:
         log_step("journal fallback", "No conversation history found")
         return {"wellness_journal_operation": None} 
 
-    # Prepare messages for the journal LLM
-    messages_for_journal_llm: list[BaseMessage] = [
-        SystemMessage(content=system_prompt_content_wf_2), # system_prompt_content is updated
-        HumanMessage(content=f"Here are the existing wellness journal entries:\n{pending_journal_updates_2}"),
-    ]
-
-    if all(isinstance(msg, BaseMessage) for msg in conversation_history):
-        messages_for_journal_llm.extend(conversation_history)
-    else:
+    if not all(isinstance(msg, BaseMessage) for msg in conversation_history):
         log_step("message validation", "Some messages are not BaseMessage objects, attempting conversion")
+        conversation_history = [msg for msg in conversation_history if isinstance(msg, BaseMessage)]
+
+    # Prepare messages for the journal LLM: system prompt (+ rolling summary), existing entries, recent turns
+    messages_for_journal_llm: list[BaseMessage] = context_manager.assemble(
+        conversation_history, journal_context_policy, system_prompt_content_wf_2, state.get("conversation_summary"), state.get("summarized_message_count")
+    )
+    # Dense "id | date | severity | title | summary" rows instead of a repr of every entry dict
+    recent_conversation_text = " ".join(message_text(msg) for msg in conversation_history[-4:])
+    existing_journal_entries = render_journal_context(
+        journal_store.current_entries(state.get("thread_id") or "anonymous"),
+        recent_text=recent_conversation_text,
+        max_entries=int(os.getenv("AKASI_JOURNAL_CONTEXT_MAX_ENTRIES", "20")),
+    )
+    log_step("journal entries context", f"~{estimate_text_tokens(existing_journal_entries)} tokens")
+    messages_for_journal_llm.insert(1, HumanMessage(content=f"Here are the existing wellness journal entries:\n{existing_journal_entries}"))
+    log_step("journal context", f"~{context_manager.last_token_counts[journal_context_policy.name]} tokens of conversation")
 
     messages_for_journal_llm.append(
         HumanMessage(content="Based on the full conversation history, the EXTERNALLY SAVED journal entries, AND THE PENDING updates, what is the single most appropriate wellness journal operation (ADD, UPDATE, or REMOVE) to perform next? Provide only the JSON object.")
@@ -746,7 +1184,7 @@ def wellness_journal_entry_generator_node(state: Workflow2State):
 
     try:
         log_step("journal llm invoke", f"Calling LLM with {len(messages_for_journal_llm)} messages")
-        journal_operation_result = wellness_journal_llm.invoke(messages_for_journal_llm)
+        journal_operation_result = await wellness_journal_llm.ainvoke(messages_for_journal_llm)
 
         if journal_operation_result:
             action = getattr(journal_operation_result, 'wellness_journal_entry_action', 'unknown')
@@ -770,6 +1208,55 @@ graph_builder_3.add_edge(START, "llm_wellness_journal")
 graph_workflow_2 = graph_builder_3.compile()
 
 
+# --- Fused turn mode ---
+# AKASI_TURN_MODE=fused: the agent returns reply, scanner command and journal operation in one structured
+# response instead of three Bedrock calls; turns whose structured output fails validation use the separate workflows
+fused_turn_mode = os.getenv("AKASI_TURN_MODE", "separate").lower() == "fused"
+
+
+class FusedTurnResponse(BaseModel):
+    """
+    Akasi's reply to the patient together with the body scanner command and,
+    when the exchange warrants it, the wellness journal operation for this turn.
+    """
+    reply: str = Field(..., description="Akasi's reply to the patient.")
+    body_scanner_command: BodyScannerCommandName = Field(
+        ...,
+        description="The chosen command for the body scanner animation. Must be one of the predefined commands."
+    )
+    wellness_journal_operation: Optional[WellnessJournalOperation] = Field(
+        None,
+        description="The wellness journal operation for this turn, or null if nothing should be recorded."
+    )
+
+
+async def invoke_fused_turn(messages_for_llm: List[BaseMessage], thread_id: Optional[str]) -> Optional[FusedTurnResponse]:
+    """
+    Runs the fused structured call on an assembled agent prompt.
+    Returns None when the call fails or the output does not validate, so the caller can use the separate pipeline.
+    """
+    existing_journal_entries = render_journal_context(
+        journal_store.current_entries(thread_id or "anonymous"),
+        recent_text=" ".join(message_text(msg) for msg in messages_for_llm[-4:]),
+        max_entries=int(os.getenv("AKASI_JOURNAL_CONTEXT_MAX_ENTRIES", "20")),
+    )
+    fused_system_prompt = messages_for_llm[0].content + FUSED_TURN_SYSTEM_MESSAGE_TEMPLATE.format(
+        # Guidelines only: the standalone prompts' output instructions ("a single JSON object", "NONE") contradict FusedTurnResponse
+        body_scanner_guidelines=BODY_SCANNER_COMMAND_GUIDELINES,
+        wellness_journal_guidelines=WELLNESS_JOURNAL_GUIDELINES_TEMPLATE.format(current_date_manila_iso=current_date_manila_iso),
+        existing_journal_entries=existing_journal_entries,
+    )
+    try:
+        result = await model_registry.structured("fused", FusedTurnResponse).ainvoke([SystemMessage(content=fused_system_prompt)] + messages_for_llm[1:])
+    except Exception as e:
+        log_error("fused turn", e)
+        return None
+    if not isinstance(result, FusedTurnResponse) or not result.reply.strip():
+        log_step("fused turn", "Structured output missing or empty, falling back to separate workflows")
+        return None
+    return result
+
+
 
 
 
@@ -779,7 +1266,7 @@ async def process_wellness_journal_data(input_payload_for_journal):
     """
     log_step("journal processor", "Starting journal data processing")
 
-    journal_output_process_2 = graph_workflow_2.invoke(input_payload_for_journal)
+    journal_output_process_2 = await graph_workflow_2.ainvoke(input_payload_for_journal)
     actual_journal_operation = journal_output_process_2.get("wellness_journal_operation")
 
     if actual_journal_operation is None:
@@ -796,13 +1283,107 @@ async def process_wellness_journal_data(input_payload_for_journal):
     }    
 
     log_step("journal entry created", f"{wellness_journal_final_entries['wellness_journal_entry_action']} - {wellness_journal_final_entries['wellness_journal_title']}")
-    pending_journal_updates.append(wellness_journal_final_entries)
-    pending_journal_updates_2.append(wellness_journal_final_entries)
+    return await publish_wellness_journal_operation(input_payload_for_journal.get("thread_id") or "anonymous", wellness_journal_final_entries)
+
 
-    log_success("journal processor", f"Added to queue (total pending: {len(pending_journal_updates)})")
+async def publish_wellness_journal_operation(journal_key: str, wellness_journal_final_entries: dict):
+    """
+    Applies a journal operation to the conversation's journal and queues it for the UI.
+    Returns the operation as applied, or None if the journal store rejected it.
+    """
+    # ADD gets a server-allocated ID; UPDATE/REMOVE of an entry that does not exist would only produce a no-op card
+    resolved_operation = journal_store.resolve(journal_key, wellness_journal_final_entries)
+    if resolved_operation is None or not journal_store.apply(journal_key, resolved_operation):
+        log_step("journal processor", f"Operation rejected by journal store ({journal_store.stats(journal_key)})")
+        return None
+    wellness_journal_final_entries = resolved_operation
+    await journal_update_broker.publish(journal_key, wellness_journal_final_entries)
+
+    log_success("journal processor", f"Added to queue (pending for {journal_key}: {journal_update_broker.pending(journal_key)}, journal: {journal_store.stats(journal_key)})")
     return wellness_journal_final_entries
 
 
+async def run_body_scanner_workflow(messages: list, conversation_summary: Optional[str] = None, summarized_message_count: Optional[int] = None, thread_id: Optional[str] = None) -> str:
+    """
+    Runs the body scanner commander workflow on a message list and returns the command.
+    Retries and duplicate submits of the same turn in the same thread are answered from the memo cache.
+    """
+    workflow_input_state = {
+        "messages": messages,
+        "input_base64_images": None,
+        "body_scanner_command": None,
+        "conversation_summary": conversation_summary,
+        "summarized_message_count": summarized_message_count,
+        "thread_id": thread_id,
+    }
+
+    async def invoke_scanner_workflow() -> str:
+        body_scan_command_wf = await graph_workflow_1.ainvoke(workflow_input_state)
+        return body_scan_command_wf.get("body_scanner_command") or "idle"
+
+    command = await scanner_command_cache.get_or_compute(messages, invoke_scanner_workflow, thread_id=thread_id)
+    log_step("scanner command cache", command, scanner_command_cache.stats())
+    return command
+
+
+async def run_wellness_journal_workflow(messages: list, conversation_summary: Optional[str] = None, summarized_message_count: Optional[int] = None, thread_id: Optional[str] = None):
+    """
+    Runs the wellness journal controller workflow on a message list.
+    Resulting operations are queued under 'thread_id' in the journal update broker.
+    Turns the local journal gate rules out never reach the journal LLM.
+    """
+    if journal_gate is not None and any(isinstance(msg, HumanMessage) for msg in messages):
+        has_entries = bool(journal_store.current_entries(thread_id or "anonymous"))
+        previous_reply, user_turn_text = latest_exchange_text(messages)
+        if not journal_gate.should_run(user_turn_text, has_entries=has_entries, has_attachments=latest_turn_has_images(messages), previous_reply=previous_reply):
+            log_step("journal gate", "Skipped journal controller", journal_gate.stats())
+            return None
+    workflow_input_state = {
+        "messages": messages,
+        "input_base64_images": None,
+        "body_scanner_command": None,
+        "conversation_summary": conversation_summary,
+        "summarized_message_count": summarized_message_count,
+        "thread_id": thread_id,
+    }
+    return await process_wellness_journal_data(workflow_input_state)
+
+
+def latest_exchange_text(messages: list) -> tuple[str, str]:
+    """
+    Texts for the journal gate: Akasi's reply before the latest user message (the question
+    a bare yes/no answers) and the text it judges, i.e. the user message plus the turn's tool output.
+    """
+    latest_human_index = max((i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)), default=-1)
+    if latest_human_index < 0:
+        return "", ""
+    previous_reply = next(
+        (msg for msg in reversed(messages[:latest_human_index]) if isinstance(msg, AIMessage) and message_text(msg).strip()),
+        None,
+    )
+    user_turn = [messages[latest_human_index]] + [msg for msg in messages[latest_human_index + 1:] if isinstance(msg, ToolMessage)]
+    return (
+        message_text(previous_reply) if previous_reply is not None else "",
+        "\n".join(message_text(msg) for msg in user_turn),
+    )
+
+
+# Set AKASI_JOURNAL_GATE=0 to send every turn to the journal controller
+journal_gate = (
+    JournalGate(recall_target=float(os.getenv("AKASI_JOURNAL_GATE_RECALL", "0.95")))
+    if os.getenv("AKASI_JOURNAL_GATE", "1").lower() in ("1", "true", "yes")
+    else None
+)
+
+
+# Set AKASI_SPECULATIVE_SCANNER=1 to start the scanner on the user message while the agent is still thinking
+turn_scheduler = TurnScheduler(
+    run_scanner=run_body_scanner_workflow,
+    run_journal=run_wellness_journal_workflow,
+    speculative_scanner=os.getenv("AKASI_SPECULATIVE_SCANNER", "0").lower() in ("1", "true", "yes"),
+)
+
+
 
 
 
@@ -887,25 +1468,41 @@ def render_single_journal_entry_ft(entry_data: dict):
 
 
 
-async def llm_agent_1(user_message: str, attachments_data: Optional[list[dict]] = None):
+def get_conversation_thread_id(req, sess) -> str:
+    """
+    Builds the LangGraph thread ID for the current user's conversation.
+    The conversation ID lives in the session and is dropped on login and logout,
+    so each login gets its own thread.
+    """
+    auth = req.scope.get('auth') or sess.get('user') or {}
+    conversation_id = sess.get('conversation_id')
+    if not conversation_id:
+        conversation_id = uuid.uuid4().hex
+        sess['conversation_id'] = conversation_id
+    return f"{auth.get('id', 'anonymous')}:{conversation_id}"
+
+
+async def llm_agent_1(user_message: str, attachments_data: Optional[list[dict]] = None, thread_id: str = "anonymous"):
     """
     Processes the user message and optional image attachments,
     invokes the LangGraph agent, and returns the final response.
     'attachments_data' is expected to be a list of dictionaries, where each dict has:
     {"filename": "...", "content_type": "image/png", "base64": "..."}
+    'thread_id' selects the user's conversation in the checkpointer (see get_conversation_thread_id).
     """
-    log_step("main llm agent", f"Using Claude 4 Sonnet for text processing: {user_message[:100]}{'...' if len(user_message) > 100 else ''}")
+    log_step("main llm agent", f"Using {model_registry.specs['agent']['model']} for text processing: {user_message[:100]}{'...' if len(user_message) > 100 else ''}")
     
     if attachments_data:
-        log_step("attachments", f"Processing {len(attachments_data)} attachments (will use Claude 3.7 for image analysis)")
+        log_step("attachments", f"Processing {len(attachments_data)} attachments (will use {model_registry.specs['image_tool']['model']} for image analysis)")
 
     message_content_parts: List[dict] = [{"type": "text", "text": user_message}]
     image_details_for_state_and_tool: List[dict] = [] 
 
     if attachments_data:
         for att_data in attachments_data:
-            b64_string = att_data.get("base64")
-            media_type = att_data.get("content_type", "image/jpeg")
+            # The only place attachment bytes are base64-encoded
+            b64_string = base64_payload(att_data)
+            media_type = att_data.get("content_type") or "image/jpeg"
 
             if b64_string:
                 message_content_parts.append({
@@ -915,17 +1512,49 @@ async def llm_agent_1(user_message: str, attachments_data: Optional[list[dict]]
                 image_details_for_state_and_tool.append({"data": b64_string, "media_type": media_type})
                 log_step("attachment processed", f"{media_type} - {truncate_base64(b64_string)}")
 
-    config = cast(Any, {"configurable": {"thread_id": "1"}})
+    if isinstance(memory, BoundedMemorySaver):
+        memory.ensure_sweeper(
+            float(os.getenv("AKASI_CHECKPOINT_SWEEP_SECONDS", "300")),
+            on_report=lambda report: log_step("checkpoint sweeper", f"Reclaimed {report['reclaimed_bytes']} bytes in {report['duration_seconds']:.3f}s", report["reclaimed_bytes_by_thread"]),
+        )
+    elif isinstance(memory, SqliteCheckpointSaver):
+        memory.ensure_sweeper(
+            float(os.getenv("AKASI_CHECKPOINT_SWEEP_SECONDS", "300")),
+            keep_latest=int(os.getenv("AKASI_CHECKPOINT_KEEP_LATEST", "3")) or None,
+            on_report=lambda report: log_step("checkpoint sweeper", f"Compacted SQLite checkpoints in {report['duration_seconds']:.3f}s", report),
+        )
+
+    if attachment_gc_enabled:
+        attachment_gc.ensure_sweeper(
+            float(os.getenv("AKASI_ATTACHMENT_GC_SECONDS", "600")),
+            on_report=lambda report: log_step("attachment gc", f"Deleted {report['rows_deleted']} rows and {report['blobs_deleted']} blobs ({report['bytes_reclaimed']} bytes) in {report['duration_seconds']:.3f}s", attachment_gc.stats()),
+        )
+
+    config = cast(Any, {"configurable": {"thread_id": thread_id}})
     initial_messages = HumanMessage(content=cast(Any, message_content_parts))
     
     initial_graph_state = {
         "messages": [initial_messages],  # Wrap single message in a list
         "input_base64_images": image_details_for_state_and_tool if image_details_for_state_and_tool else None,
+        "thread_id": thread_id,
+        "fused_turn": None,
+        "tool_round_trips": 0,
+        "turn_started_at": time.time(),
     }
+    turn_started_at = time.perf_counter()
 
     log_step("graph state", f"Created with {len(initial_graph_state['messages'])} messages, images: {bool(initial_graph_state['input_base64_images'])}")
 
-    final_state = graph_1.invoke(initial_graph_state, config)
+    # Speculative mode: the scanner only needs the user's words, so let it run while the agent thinks
+    speculative_scan = turn_scheduler.start_speculative_scan([HumanMessage(content=user_message)], thread_id=thread_id)
+
+    # ainvoke keeps the event loop free while Bedrock is thinking, so one worker can serve many turns
+    try:
+        final_state = await graph_1.ainvoke(initial_graph_state, config)
+    except BaseException:
+        # The turn failed, so nobody will await the speculative scan
+        turn_scheduler.discard_speculative_scan(speculative_scan)
+        raise
 
     final_ai_response_content = "No response generated."
     final_ai_message = None
@@ -944,30 +1573,37 @@ async def llm_agent_1(user_message: str, attachments_data: Optional[list[dict]]
             final_ai_response_content = str(last_message_obj.content)
 
     log_success("ai response", str(final_ai_response_content))
+    log_step("tool loop", f"Round trips this turn: {final_state.get('tool_round_trips') or 0}", tool_loop_metrics)
+    if isinstance(memory, BoundedMemorySaver):
+        # In-memory counters only; SQLite stats need table scans and are logged by its sweeper
+        log_step("checkpoint memory", f"Thread: {thread_id}", memory.stats())
 
     ai_response = final_ai_response_content
 
-    workflow_input_state = {
-        "messages": final_state.get("messages", []), 
-        "input_base64_images": None,
-        "body_scanner_command": None 
-    }    
-
-    body_scan_command_wf = graph_workflow_1.invoke(workflow_input_state)
-    log_step("body scanner result", body_scan_command_wf["body_scanner_command"])
-
-    workflow_input_state = {
-        "messages": final_state.get("messages", []), 
-        "input_base64_images": None,
-        "body_scanner_command": None 
-    }    
-
-    asyncio.create_task(process_wellness_journal_data(workflow_input_state))
-    log_step("background task", "Journal processor scheduled")
+    fused_turn = final_state.get("fused_turn")
+    if fused_turn:
+        # The agent already returned the scanner command and journal operation with its reply
+        turn_scheduler.discard_speculative_scan(speculative_scan)
+        body_scanner_command = fused_turn["body_scanner_command"]
+        if fused_turn.get("wellness_journal_operation"):
+            await publish_wellness_journal_operation(thread_id, fused_turn["wellness_journal_operation"])
+    else:
+        # Scanner and journal start together; only the scanner is awaited, the journal keeps running in the background
+        secondary_results = await turn_scheduler.run_secondary_workflows(
+            strip_images_from_history(final_state.get("messages", [])),
+            speculative_scan=speculative_scan,
+            conversation_summary=final_state.get("conversation_summary"),
+            summarized_message_count=final_state.get("summarized_message_count"),
+            thread_id=thread_id,
+        )
+        body_scanner_command = secondary_results["body_scanner_command"]
+        log_step("turn scheduler", f"Scanner wait: {secondary_results['scanner_wait_seconds']:.2f}s, speculative: {secondary_results['used_speculative_scan']}, journal tasks in flight: {turn_scheduler.pending_background_tasks}")
+    log_step("body scanner result", body_scanner_command)
+    log_step("turn mode", f"{'fused' if fused_turn else 'separate'} in {time.perf_counter() - turn_started_at:.2f}s", dict(context_manager.last_token_counts))
 
     response_data = {
         "ai_response": f"{ai_response}", # Dynamic AI response
-        "body_scanner_animation_action_comand": body_scan_command_wf["body_scanner_command"],
+        "body_scanner_animation_action_comand": body_scanner_command,
         "trigger_wellness_journal_data_listener": "START", # This can be made dynamic too
         "output_conversation_history": "EMPTY" # Using the predefined list
     }
@@ -1018,7 +1654,11 @@ def unified_ui_controller_for_chat_window_and_body_scanner(llm_data: dict, user_
 @rt("/send_chat_message")
 async def handle_send_chat_message(req, sess):
     log_step("chat message route", "Processing incoming chat submission")
-    form_data = await req.form()
+    try:
+        form_data = await read_upload_form(req)
+    except UploadRejected as e:
+        log_step("upload rejected", str(e), upload_reader.metrics.stats())
+        return Div(P(f"Error: {e}", cls="text-red-500 text-sm"), cls="chat-bubble chat-bubble-error")
     user_message_text = form_data.get("chatInput", "")
 
     log_step("user input", f"Message: {user_message_text[:150]}{'...' if len(user_message_text) > 150 else ''}")
@@ -1029,33 +1669,12 @@ async def handle_send_chat_message(req, sess):
     attachment_uuids_for_next_step = []
     processed_attachments_for_preview = []
     
-    # This needs to be more effecient because I have to wait for the file to be converted to base64 then inserted on saupabase. I think its because of the uuid that I need to wait
     if uploaded_file_objects:
         log_step("file upload", f"Processing {len(uploaded_file_objects)} uploaded files")
-        base64_attachments_list = await process_files_to_base64_list(uploaded_file_objects)
+        processed_attachments_for_preview, attachment_uuids_for_next_step = await ingest_uploaded_files(uploaded_file_objects, get_conversation_thread_id(req, sess))
         
-        if base64_attachments_list:
-            processed_attachments_for_preview = base64_attachments_list 
-            for att_data in base64_attachments_list:
-                if "error" not in att_data and "base64" in att_data:
-                    insert_payload = {
-                        "base64_string": att_data["base64"],
-                        "file_type": att_data.get("content_type"),
-                        # Optional: "filename": att_data.get("filename") # if you added filename to your table
-                    }
-                    try:
-                        response = supabase.table("akasi_base64_image_strings").insert(insert_payload).execute()
-                        if response.data and len(response.data) > 0:
-                            new_uuid = response.data[0]['id']
-                            attachment_uuids_for_next_step.append(str(new_uuid))
-                            log_step("supabase insert", f"Stored {att_data.get('filename', 'N/A')} with UUID: {new_uuid}")
-                        else:
-                            log_error("supabase insert", Exception(f"No data returned for {att_data.get('filename', 'N/A')}"))
-                    except Exception as e:
-                        log_error("supabase insert", e)
-                else:
-                    log_step("file skip", f"Skipping {att_data.get('filename', 'N/A')} due to processing error")
-            log_success("file processing", f"Collected {len(attachment_uuids_for_next_step)} UUIDs from Supabase")
+        if processed_attachments_for_preview:
+            log_success("file processing", f"Collected {len(attachment_uuids_for_next_step)} attachment UUIDs")
         else:
             log_step("file processing", "No valid attachments to store")
     
@@ -1084,6 +1703,13 @@ async def handle_send_chat_message(req, sess):
                     cls="flex items-center p-1.5 bg-primary/10 rounded"
                 )
                 attachment_previews_container_items.append(preview_item)
+            else:
+                # Failed uploads (invalid file, storage error) are shown instead of silently dropped
+                attachment_previews_container_items.append(Div(
+                    Span("error_outline", cls="material-icons emoji-icon text-lg mr-1.5 text-error flex-shrink-0"),
+                    Span(f"{att_info.get('filename', 'N/A')}: {att_info['error']}", cls="text-xs text-error truncate"),
+                    cls="flex items-center p-1.5 bg-error/10 rounded"
+                ))
         
         if attachment_previews_container_items:
             user_chat_bubble_content_elements.append(
@@ -1179,31 +1805,24 @@ async def get_ai_actual_response_route(req, sess):
     user_message_text = urllib.parse.unquote(get_user_message)
     
     log_step("ai response route", f"Processing: {user_message_text[:100]}{'...' if len(user_message_text) > 100 else ''}")
-    log_step("pending journal check", f"Current queue size: {len(pending_journal_updates)}")      
+    log_step("pending journal check", f"Current queue size: {journal_update_broker.pending(get_conversation_thread_id(req, sess))}")      
 
 
 
     retrieved_attachments_from_supabase = [] # Renamed for clarity
-    list_of_uuids_to_delete = [] # Keep track of UUIDs to delete later
 
     if attachment_uuids_str:
         list_of_uuids = [uid.strip() for uid in attachment_uuids_str.split(',') if uid.strip()]
         if list_of_uuids:
-            log_step("attachment retrieval", f"Fetching {len(list_of_uuids)} attachments from Supabase")
+            log_step("attachment retrieval", f"Fetching {len(list_of_uuids)} attachments from the attachment store")
             try:
-                response = supabase.table("akasi_base64_image_strings").select("id, base64_string, file_type").in_("id", list_of_uuids).execute()
+                retrieved_attachments_from_supabase = await attachment_store.aget_many(list_of_uuids)
                 
-                if response.data:
-                    log_success("attachment retrieval", f"Retrieved {len(response.data)} attachments")
-                    for row in response.data:
-                        base64_content = row.get('base64_string', '')
-                        log_step("attachment data", f"Processing {row['id']}: {truncate_base64(base64_content)}")
-                        
-                        retrieved_attachments_from_supabase.append({
-                            "filename": f"attachment_{row['id']}.{row['file_type'].split('/')[-1] if row.get('file_type') else 'bin'}",
-                            "content_type": row.get('file_type'),
-                            "base64": base64_content,
-                        })
+                if retrieved_attachments_from_supabase:
+                    log_success("attachment retrieval", f"Retrieved {len(retrieved_attachments_from_supabase)} attachments")
+                    log_step("attachment store", "Retrieval stats", attachment_store.stats())
+                    for attachment in retrieved_attachments_from_supabase:
+                        log_step("attachment data", f"Processing {attachment['id']}: {attachment['size']} bytes, blob {attachment['sha256'][:12]}")
                 else:
                     log_step("attachment retrieval", f"No data returned for UUIDs: {list_of_uuids}")
             except Exception as e:
@@ -1212,9 +1831,6 @@ async def get_ai_actual_response_route(req, sess):
             log_step("attachment retrieval", "No valid UUIDs found")
             
 
-
-    # ** ADD LATER Optional but Recommended: Delete from Supabase after processing**
-
     if not user_message_text and not retrieved_attachments_from_supabase:
         return Div(
             P("Error: No message or attachments to process.", cls="text-red-500 text-sm"),
@@ -1222,7 +1838,8 @@ async def get_ai_actual_response_route(req, sess):
         )
 
 
-    llm_output = await llm_agent_1(user_message_text, attachments_data=retrieved_attachments_from_supabase) 
+    llm_output = await llm_agent_1(user_message_text, attachments_data=retrieved_attachments_from_supabase, thread_id=get_conversation_thread_id(req, sess)) 
+    await mark_attachments_consumed(retrieved_attachments_from_supabase)
 
     log_success("ai processing complete", "Generating UI response components")
 
@@ -1259,7 +1876,11 @@ async def handle_send_chat_speech_bubble(req, sess):
     Returns typing indicator first, then triggers AI response.
     """
     log_step("speech bubble route", "Processing speech bubble chat submission")
-    form_data = await req.form()
+    try:
+        form_data = await read_upload_form(req)
+    except UploadRejected as e:
+        log_step("upload rejected", str(e), upload_reader.metrics.stats())
+        return Div(str(e), cls="akasi-speech-text error-message")
     user_message_text = form_data.get("chatInput", "")
 
     log_step("speech bubble input", f"Message: {user_message_text[:150]}{'...' if len(user_message_text) > 150 else ''}")
@@ -1270,23 +1891,8 @@ async def handle_send_chat_speech_bubble(req, sess):
     
     if uploaded_file_objects:
         log_step("speech bubble files", f"Processing {len(uploaded_file_objects)} uploaded files")
-        base64_attachments_list = await process_files_to_base64_list(uploaded_file_objects)
-        
-        if base64_attachments_list:
-            for att_data in base64_attachments_list:
-                if "error" not in att_data and "base64" in att_data:
-                    insert_payload = {
-                        "base64_string": att_data["base64"],
-                        "file_type": att_data.get("content_type"),
-                    }
-                    try:
-                        response = supabase.table("akasi_base64_image_strings").insert(insert_payload).execute()
-                        if response.data and len(response.data) > 0:
-                            new_uuid = response.data[0]['id']
-                            attachment_uuids_for_next_step.append(str(new_uuid))
-                            log_step("speech bubble supabase", f"Stored {att_data.get('filename', 'N/A')} with UUID: {new_uuid}")
-                    except Exception as e:
-                        log_error("speech bubble supabase", e)
+        _, attachment_uuids_for_next_step = await ingest_uploaded_files(uploaded_file_objects, get_conversation_thread_id(req, sess))
+        log_step("speech bubble files", f"Stored {len(attachment_uuids_for_next_step)} attachments")
 
     if not user_message_text and not attachment_uuids_for_next_step:
         # Return error message in speech bubble
@@ -1349,14 +1955,7 @@ async def get_speech_bubble_response_route(req, sess):
         list_of_uuids = [uid.strip() for uid in attachment_uuids_str.split(',') if uid.strip()]
         if list_of_uuids:
             try:
-                response = supabase.table("akasi_base64_image_strings").select("id, base64_string, file_type").in_("id", list_of_uuids).execute()
-                if response.data:
-                    for row in response.data:
-                        retrieved_attachments_from_supabase.append({
-                            "filename": f"attachment_{row['id']}.{row['file_type'].split('/')[-1] if row.get('file_type') else 'bin'}",
-                            "content_type": row.get('file_type'),
-                            "base64": row.get('base64_string', ''),
-                        })
+                retrieved_attachments_from_supabase = await attachment_store.aget_many(list_of_uuids)
             except Exception as e:
                 log_error("speech bubble attachment retrieval", e)
 
@@ -1368,7 +1967,8 @@ async def get_speech_bubble_response_route(req, sess):
 
     try:
         # Process through the same AI agent as regular chat
-        llm_output = await llm_agent_1(user_message_text, attachments_data=retrieved_attachments_from_supabase)
+        llm_output = await llm_agent_1(user_message_text, attachments_data=retrieved_attachments_from_supabase, thread_id=get_conversation_thread_id(req, sess))
+        await mark_attachments_consumed(retrieved_attachments_from_supabase)
         ai_response_text = llm_output.get("ai_response", "I apologize, but I'm having trouble processing your request right now. Please try again.")
 
         # Trigger body scanner command if present
@@ -1846,11 +2446,12 @@ def post_finalize_wellness_journal():
 
 
 @rt("/htmx/journal_entry_action")
-async def post_journal_action_handler(req): # Renamed for clarity
+async def post_journal_action_handler(req, sess): # Renamed for clarity
     # This endpoint will be called by HTMX forms or buttons
     form_data = await req.form()
     action = form_data.get("wellness_journal_entry_action")
     entry_id = form_data.get("wellness_journal_entry_id")
+    journal_key = get_conversation_thread_id(req, sess)
 
     log_step("journal action", f"Action: {action}, ID: {entry_id}")
 
@@ -1860,12 +2461,13 @@ async def post_journal_action_handler(req): # Renamed for clarity
         # For now, it just acknowledges. If server-side state of entries needs updating, do it here.
         # We might need to send OOB swaps for the placeholder/clear button if the list becomes empty.
         # This is now handled by the htmx:afterSwap JS listener as a simpler client-side check.
+        journal_store.apply(journal_key, {"wellness_journal_entry_id": entry_id, "wellness_journal_entry_action": "REMOVE"})
         log_success("remove action", f"Entry ID {entry_id} removed from server state")
         return "" # Empty response because client-side swap handles DOM.
 
     elif action == "ADD": # This will be used by the manual entry form
         new_entry_data = {
-            "wellness_journal_entry_id": str(form_data.get("id", time.time_ns())), # Use form ID or generate
+            "wellness_journal_entry_id": journal_store.allocate_id(journal_key), # Same ID sequence as model-generated entries
             "wellness_journal_title": form_data.get("title", "Untitled Entry"),
             "wellness_journal_current_summary": form_data.get("summary", "No summary provided."),
             "wellness_journal_severity": int(form_data.get("status", 1)),
@@ -1873,6 +2475,11 @@ async def post_journal_action_handler(req): # Renamed for clarity
             # "wellness_journal_entry_action": "ADD" # Already known
         }
         # Here you would save to a database in a real application.
+        journal_store.apply(journal_key, {
+            **new_entry_data,
+            "wellness_journal_severity_value": new_entry_data["wellness_journal_severity"],
+            "wellness_journal_entry_action": "ADD",
+        })
 
         new_entry_ft = render_single_journal_entry_ft(new_entry_data)
         # OOB swaps for placeholder and clear button visibility
@@ -1897,20 +2504,19 @@ async def post_journal_action_handler(req): # Renamed for clarity
 
 
 @rt("/htmx/get_journal_update")
-def get_journal_update_handler(): 
-    global pending_journal_updates # Use the primary queue for UI updates
-    global pending_journal_updates_2 # Master list, used for context in REMOVE OOB
+async def get_journal_update_handler(req, sess): 
+    journal_key = get_conversation_thread_id(req, sess) # Only this conversation's queue
     
-    log_step("journal update handler", f"Processing queue (size: {len(pending_journal_updates)})")
+    log_step("journal update handler", f"Processing queue (size: {journal_update_broker.pending(journal_key)})")
 
     rendered_html_component = None
     action_performed = None
     processed_entry_id = None
     entry_operation_data = None # Initialize
 
-    if pending_journal_updates:
+    if journal_update_broker.pending(journal_key):
         try:
-            entry_operation_data = pending_journal_updates.pop(0) 
+            entry_operation_data = await journal_update_broker.pop(journal_key)
             
             if not isinstance(entry_operation_data, dict):
                 log_error("journal update", Exception(f"Invalid data type: {type(entry_operation_data)}"))
@@ -1920,10 +2526,11 @@ def get_journal_update_handler():
                 processed_entry_id = entry_operation_data.get("wellness_journal_entry_id")
                 log_step("journal operation", f"{action_performed} - ID: {processed_entry_id}")
             
-            # Attempt to render if data is suitable for ADD/UPDATE
+            # Attempt to render if data is suitable for ADD/UPDATE (from the current entry, not the raw operation)
             if entry_operation_data and action_performed in ["ADD", "UPDATE"]:
                 log_step("render component", f"Creating UI for {action_performed}")
-                rendered_html_component = render_single_journal_entry_ft(entry_operation_data)
+                current_entry = journal_store.get(journal_key, processed_entry_id) or entry_operation_data
+                rendered_html_component = render_single_journal_entry_ft(current_entry)
             elif entry_operation_data and action_performed == "REMOVE" and processed_entry_id:
                 # For REMOVE, create a specific empty component for OOB removal
                 target_id_attr = f"journal-entry-{processed_entry_id}"
@@ -1985,7 +2592,7 @@ def get_journal_update_handler():
     elif action_performed == "REMOVE": 
         # rendered_html_component here is the empty Div(id=target_id_attr, hx_swap_oob="true")
         log_step("remove entry", f"Removing entry ID: {processed_entry_id}")
-        if not pending_journal_updates_2: # Check the master list for emptiness
+        if not journal_store.current_entries(journal_key): # Check the current journal for emptiness
              log_step("list empty", "No more entries, showing placeholder")
              
              # Restore the complete placeholder content
@@ -2027,9 +2634,10 @@ def get_journal_update_handler():
 
 
 @rt("/htmx/clear_journal")
-async def post_clear_journal_handler(req): # Changed name
-    global pending_journal_updates
-    pending_journal_updates = [] # Clear any pending automated updates as well
+async def post_clear_journal_handler(req, sess): # Changed name
+    journal_key = get_conversation_thread_id(req, sess)
+    journal_store.clear(journal_key)
+    await journal_update_broker.clear(journal_key) # Clear any pending automated updates as well
 
     # In a real app, you would clear entries from your database here.
 
@@ -2476,6 +3084,7 @@ async def signup_submit(req, sess):
             user = res.user
             session = res.session
             
+            sess.pop('conversation_id', None)
             sess['user'] = {
                 'id': user.id, 
                 'email': user.email,
@@ -3072,6 +3681,7 @@ async def login_post(req, sess): # Changed to req, sess to match common FastHTML
         user = res.user
         session = res.session
         
+        sess.pop('conversation_id', None)
         sess['user'] = {
             'id': user.id, 
             'email': user.email,
@@ -4061,12 +4671,14 @@ def profile_tab_view(auth):
 def get(sess):
     supabase.auth.sign_out()
     if 'user' in sess: del sess['user']
+    sess.pop('conversation_id', None)
     return RedirectResponse('/', status_code=303)
 
 @rt('/logout')
 def post(sess):
     supabase.auth.sign_out()
     if 'user' in sess: del sess['user']
+    sess.pop('conversation_id', None)
     return RedirectResponse('/', status_code=303)
 
 serve()
\ No newline at end of file
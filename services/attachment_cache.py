@@ -0,0 +1,92 @@
+"""
+Short-lived in-process cache of uploaded attachments.
+
+/send_chat_message stores the uploads and, a few hundred milliseconds later,
+/get_ai_actual_response (or /get_speech_bubble_response) loads the same attachments by
+UUID. When both requests land on the same worker the bytes are still in memory, so
+AttachmentStore fills this cache on upload and checks it before going to the metadata
+table and blob backend. Entries expire after a TTL and are evicted LRU beyond an entry
+count or byte budget; a miss (e.g. a request served by another worker) falls back to
+the store.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class AttachmentCache:
+    """
+    TTL + LRU cache of attachment dicts keyed by attachment ID.
+
+    Args:
+        max_entries: Maximum number of cached attachments.
+        max_bytes: Maximum total size of the cached attachment bytes.
+        ttl_seconds: How long an attachment stays cached after upload.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 120):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _drop(self, attachment_id: str) -> None:
+        _, attachment = self._entries.pop(attachment_id)
+        self.total_bytes -= len(attachment.get("data") or b"")
+
+    def put(self, attachment: dict) -> None:
+        """Caches an attachment (without any base64 added to it later)."""
+        data = attachment.get("data")
+        if not attachment.get("id") or data is None or len(data) > self.max_bytes:
+            return
+        entry = {key: value for key, value in attachment.items() if key != "base64"}
+        with self._lock:
+            if entry["id"] in self._entries:
+                self._drop(entry["id"])
+            self._entries[entry["id"]] = (time.monotonic(), entry)
+            self.total_bytes += len(data)
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evicted += 1
+
+    def get(self, attachment_id: str) -> Optional[dict]:
+        """Returns a copy of the cached attachment, or None on a miss or expiry."""
+        with self._lock:
+            cached = self._entries.get(attachment_id)
+            if cached is None:
+                self.misses += 1
+                return None
+            stored_at, attachment = cached
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._drop(attachment_id)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(attachment_id)
+            self.hits += 1
+            return dict(attachment)
+
+    def discard(self, attachment_id: str) -> None:
+        with self._lock:
+            if attachment_id in self._entries:
+                self._drop(attachment_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,257 @@
+"""
+Background garbage collection of processed chat attachments.
+
+Attachments are only needed until the turn that uploaded them has been answered: after
+that the conversation keeps a text reference and image summary instead of the bytes
+(see services.message_transforms). The response routes mark attachments consumed, and
+AttachmentGarbageCollector periodically deletes
+
+* consumed rows older than 'retention_seconds', and
+* never-consumed rows older than 'orphan_seconds' (uploads whose response never came),
+
+in batches, with chunked `in_` deletes. Rows of conversations for which 'is_protected'
+returns True (e.g. a persisted conversation whose checkpoint still carries the images)
+are kept and deferred for 'defer_seconds', so they do not fill every following batch.
+
+Blobs are shared by identical uploads, so deleting a row only tombstones its blob. A
+tombstoned blob is removed once it is older than 'blob_grace_seconds' and, re-checked
+right before the delete, no metadata row references it. AttachmentStore inserts an
+upload's metadata row before writing its blob, so an upload that reuses the blob is
+either seen by that check or rewrites the blob after the delete. Tombstones live in a
+table, so they survive restarts and are shared by all workers.
+
+Every worker runs a collector. With a lease table, run_sweeper() only sweeps in the
+worker holding (or renewing) the lease row, so sweeps of different workers never overlap.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+TOMBSTONES_TABLE = "akasi_attachment_tombstones"
+LEASE_TABLE = "akasi_attachment_gc_lease"
+LEASE_NAME = "attachment_gc"
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class AttachmentGarbageCollector:
+    """
+    Deletes expired attachment rows and their unreferenced blobs.
+
+    Args:
+        store: services.attachment_store.AttachmentStore.
+        retention_seconds: How long consumed attachments are kept.
+        orphan_seconds: How long attachments that were never consumed are kept.
+        batch_size: Maximum rows (and tombstones) examined per sweep.
+        chunk_size: IDs per `in_` delete / lookup.
+        is_protected: Optional callable(conversation_id) -> bool; protected conversations' rows are kept.
+        defer_seconds: How long protected rows are skipped before they are examined again.
+        blob_grace_seconds: Minimum age of a tombstone before its blob is deleted.
+        tombstones_table: Table holding blobs pending deletion.
+        lease_table: Table holding the sweeper lease row; None sweeps without a lease.
+    """
+
+    def __init__(
+        self,
+        store,
+        retention_seconds: float = 3600,
+        orphan_seconds: float = 86400,
+        batch_size: int = 1000,
+        chunk_size: int = 100,
+        is_protected: Optional[Callable[[str], bool]] = None,
+        defer_seconds: float = 3600,
+        blob_grace_seconds: float = 600,
+        tombstones_table: str = TOMBSTONES_TABLE,
+        lease_table: Optional[str] = LEASE_TABLE,
+    ):
+        self.store = store
+        self.retention_seconds = retention_seconds
+        self.orphan_seconds = orphan_seconds
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.is_protected = is_protected
+        self.defer_seconds = defer_seconds
+        self.blob_grace_seconds = blob_grace_seconds
+        self.tombstones_table = tombstones_table
+        self.lease_table = lease_table
+        self._lease_holder = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.rows_deleted = 0
+        self.blobs_deleted = 0
+        self.bytes_reclaimed = 0
+        self.rows_protected = 0
+        self.last_sweep_seconds = 0.0
+
+    def _table(self, name: Optional[str] = None):
+        return self.store.metadata_client.table(name or self.store.table)
+
+    def _expired_rows(self, now: datetime) -> list[dict]:
+        columns = "id, sha256, size_bytes, conversation_id"
+        # Rows of protected conversations are deferred instead of reselected every sweep
+        not_deferred = f"gc_deferred_until.is.null,gc_deferred_until.lt.{now.isoformat()}"
+        rows = (
+            self._table().select(columns)
+            .lt("consumed_at", (now - timedelta(seconds=self.retention_seconds)).isoformat())
+            .or_(not_deferred)
+            .limit(self.batch_size)
+            .execute()
+        ).data or []
+        if len(rows) < self.batch_size:
+            rows += (
+                self._table().select(columns)
+                .is_("consumed_at", "null")
+                .lt("created_at", (now - timedelta(seconds=self.orphan_seconds)).isoformat())
+                .or_(not_deferred)
+                .limit(self.batch_size - len(rows))
+                .execute()
+            ).data or []
+        return rows
+
+    def _referenced(self, hashes: list[str]) -> set:
+        referenced = set()
+        for chunk in _chunks(hashes, self.chunk_size):
+            remaining = self._table().select("sha256").in_("sha256", chunk).execute().data or []
+            referenced.update(row["sha256"] for row in remaining)
+        return referenced
+
+    def _delete_tombstoned_blobs(self, now: datetime) -> tuple[int, int]:
+        tombstones = (
+            self._table(self.tombstones_table).select("sha256, size_bytes")
+            .lt("created_at", (now - timedelta(seconds=self.blob_grace_seconds)).isoformat())
+            .limit(self.batch_size)
+            .execute()
+        ).data or []
+        blobs_deleted = 0
+        bytes_reclaimed = 0
+        for chunk in _chunks(tombstones, self.chunk_size):
+            hashes = [tombstone["sha256"] for tombstone in chunk]
+            # Re-checked right before deleting: a new upload of the same file may reference the blob again
+            referenced = self._referenced(hashes)
+            settled = []
+            for tombstone in chunk:
+                sha256 = tombstone["sha256"]
+                if sha256 not in referenced:
+                    try:
+                        self.store.backend.delete(sha256)
+                    except Exception as e:
+                        print(f"Error deleting attachment blob {sha256[:12]}: {e}")
+                        continue
+                    blobs_deleted += 1
+                    bytes_reclaimed += tombstone.get("size_bytes") or 0
+                settled.append(sha256)
+            if settled:
+                self._table(self.tombstones_table).delete().in_("sha256", settled).execute()
+        return blobs_deleted, bytes_reclaimed
+
+    def _acquire_lease(self, now: datetime, lease_seconds: float) -> bool:
+        """Takes (or renews) the lease row; False while another worker holds an unexpired lease."""
+        response = (
+            self._table(self.lease_table)
+            .update({"holder": self._lease_holder, "expires_at": (now + timedelta(seconds=lease_seconds)).isoformat()})
+            .eq("name", LEASE_NAME)
+            .or_(f"expires_at.lt.{now.isoformat()},holder.eq.{self._lease_holder}")
+            .execute()
+        )
+        return bool(response.data)
+
+    def sweep(self, lease_seconds: Optional[float] = None) -> Optional[dict]:
+        """
+        Runs one collection pass. With 'lease_seconds' (and a lease table), returns None
+        without sweeping while another worker holds the lease.
+
+        Returns:
+            Rows deleted, blobs deleted, bytes reclaimed, rows deferred for protected conversations
+            and how long the sweep took.
+        """
+        started_at = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        if lease_seconds is not None and self.lease_table and not self._acquire_lease(now, lease_seconds):
+            return None
+        rows = self._expired_rows(now)
+
+        protected_conversations: dict[str, bool] = {}
+        deletable = []
+        protected_ids = []
+        for row in rows:
+            conversation_id = row.get("conversation_id")
+            if conversation_id and self.is_protected is not None:
+                if conversation_id not in protected_conversations:
+                    protected_conversations[conversation_id] = self.is_protected(conversation_id)
+                if protected_conversations[conversation_id]:
+                    protected_ids.append(str(row["id"]))
+                    continue
+            deletable.append(row)
+
+        deferred_until = (now + timedelta(seconds=self.defer_seconds)).isoformat()
+        for chunk in _chunks(protected_ids, self.chunk_size):
+            self._table().update({"gc_deferred_until": deferred_until}).in_("id", chunk).execute()
+
+        # Tombstone the blobs first, so a crash between the two steps cannot leak them
+        blob_sizes = {row["sha256"]: row.get("size_bytes") or 0 for row in deletable}
+        if blob_sizes:
+            self._table(self.tombstones_table).upsert(
+                [{"sha256": sha256, "size_bytes": size} for sha256, size in blob_sizes.items()],
+                on_conflict="sha256",
+                ignore_duplicates=True,
+            ).execute()
+
+        rows_deleted = 0
+        for chunk in _chunks([str(row["id"]) for row in deletable], self.chunk_size):
+            # Counted from the deleted rows PostgREST returns, not from the IDs asked for
+            deleted = self._table().delete().in_("id", chunk).execute().data or []
+            rows_deleted += len(deleted)
+
+        if self.store.cache is not None:
+            for row in deletable:
+                self.store.cache.discard(str(row["id"]))
+
+        blobs_deleted, bytes_reclaimed = self._delete_tombstoned_blobs(now)
+
+        duration = time.perf_counter() - started_at
+        self.sweeps += 1
+        self.rows_deleted += rows_deleted
+        self.blobs_deleted += blobs_deleted
+        self.bytes_reclaimed += bytes_reclaimed
+        self.rows_protected += len(protected_ids)
+        self.last_sweep_seconds = duration
+        return {
+            "rows_deleted": rows_deleted,
+            "blobs_deleted": blobs_deleted,
+            "bytes_reclaimed": bytes_reclaimed,
+            "rows_protected": len(protected_ids),
+            "duration_seconds": duration,
+        }
+
+    async def run_sweeper(self, interval_seconds: float, on_report: Optional[Callable[[dict], None]] = None) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                # The lease outlives one interval slightly, so the holder renews it before anyone else can take it
+                report = await asyncio.to_thread(self.sweep, interval_seconds * 1.5)
+                if report is not None and on_report and (report["rows_deleted"] or report["blobs_deleted"] or report["rows_protected"]):
+                    on_report(report)
+            except Exception as e:
+                print(f"Error in attachment garbage collector: {e}")
+
+    def ensure_sweeper(self, interval_seconds: float, on_report: Optional[Callable[[dict], None]] = None) -> None:
+        """Starts the periodic collector on the running event loop if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_sweeper(interval_seconds, on_report))
+
+    def stats(self) -> dict:
+        """Returns cumulative sweep counters."""
+        return {
+            "sweeps": self.sweeps,
+            "rows_deleted": self.rows_deleted,
+            "blobs_deleted": self.blobs_deleted,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "rows_protected": self.rows_protected,
+            "last_sweep_seconds": round(self.last_sweep_seconds, 3),
+        }
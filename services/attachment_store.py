@@ -0,0 +1,359 @@
+"""
+Content-addressed storage for chat attachments.
+
+Uploads used to be base64-encoded into a text column of akasi_base64_image_strings and
+selected back as the same ~1.33x inflated string. Attachments are now stored as raw bytes
+keyed by their SHA-256 in a blob backend (a Supabase Storage bucket, or a local
+directory for tests and single-process development), and a small metadata table maps
+attachment IDs to blobs. Identical uploads share one blob. Base64 is produced lazily, once, when a Bedrock payload is built
+(see base64_payload). An optional AttachmentCache keeps freshly uploaded attachments in
+memory for the response request that follows the upload.
+
+The metadata table and the storage bucket are created by the migrations in
+supabase/migrations/ (id, sha256, content_type, filename, size_bytes, conversation_id,
+created_at, consumed_at, gc_deferred_until).
+
+Rows are marked consumed once the turn that uploaded them has been answered and are
+deleted later by services.attachment_gc.AttachmentGarbageCollector. The metadata row is
+inserted before its blob is written (and removed again if the write fails): the collector
+checks for referencing rows right before it deletes a tombstoned blob, so a re-upload of
+the same file is either seen by that check or writes the blob again after the delete.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+ATTACHMENTS_TABLE = "akasi_attachments"
+
+
+def base64_payload(attachment: dict) -> str:
+    """Base64 of an attachment's bytes, encoded on first use and kept on the dict."""
+    if not attachment.get("base64") and attachment.get("data") is not None:
+        attachment["base64"] = base64.b64encode(attachment["data"]).decode("utf-8")
+    return attachment.get("base64") or ""
+
+
+class LocalDirectoryBackend:
+    """
+    Blob backend on a local directory; blobs live at <root>/<sha[:2]>/<sha>.
+
+    Args:
+        root: Directory for the blobs (created if missing).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self._path(sha256))
+
+    def put(self, sha256: str, data: bytes) -> bool:
+        """Writes a blob (atomic rename). Returns False if it was already stored."""
+        path = self._path(sha256)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    def get(self, sha256: str) -> bytes:
+        with open(self._path(sha256), "rb") as f:
+            return f.read()
+
+    def delete(self, sha256: str) -> None:
+        try:
+            os.remove(self._path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+class SupabaseStorageBackend:
+    """
+    Blob backend on a Supabase Storage bucket; blobs live at <sha[:2]>/<sha>.
+
+    Args:
+        client: Supabase client.
+        bucket: Storage bucket name.
+    """
+
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    def _path(self, sha256: str) -> str:
+        return f"{sha256[:2]}/{sha256}"
+
+    def exists(self, sha256: str) -> bool:
+        return bool(self.client.storage.from_(self.bucket).list(sha256[:2], {"search": sha256}))
+
+    def put(self, sha256: str, data: bytes) -> bool:
+        """
+        Uploads a blob in one request. An existing blob has the same content, so it is simply
+        overwritten (upsert) instead of checked first; always reports True.
+        """
+        self.client.storage.from_(self.bucket).upload(
+            self._path(sha256), data, {"content-type": "application/octet-stream", "upsert": "true"}
+        )
+        return True
+
+    def get(self, sha256: str) -> bytes:
+        return self.client.storage.from_(self.bucket).download(self._path(sha256))
+
+    def delete(self, sha256: str) -> None:
+        self.client.storage.from_(self.bucket).remove([self._path(sha256)])
+
+
+class AttachmentStore:
+    """
+    Attachment metadata rows plus content-addressed blobs.
+
+    Args:
+        backend: LocalDirectoryBackend, SupabaseStorageBackend or anything with put/get/delete.
+        metadata_client: Supabase client holding the metadata table.
+        table: Metadata table name.
+        cache: Optional services.attachment_cache.AttachmentCache filled on put and read first on get.
+    """
+
+    def __init__(self, backend, metadata_client, table: str = ATTACHMENTS_TABLE, cache=None):
+        self.backend = backend
+        self.metadata_client = metadata_client
+        self.table = table
+        self.cache = cache
+        self._lock = threading.Lock()
+        self.blobs_written = 0
+        self.blobs_deduplicated = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def _write_blob(self, sha256: str, data: bytes) -> None:
+        written = self.backend.put(sha256, data)
+        with self._lock:
+            if written:
+                self.blobs_written += 1
+                self.bytes_written += len(data)
+            else:
+                self.blobs_deduplicated += 1
+
+    def put(self, data: bytes, content_type: Optional[str], filename: Optional[str] = None, conversation_id: Optional[str] = None) -> dict:
+        """
+        Stores an attachment's bytes and metadata row.
+
+        Returns:
+            {"id", "sha256", "content_type", "filename", "size", "data"}.
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        # Row before blob, see the module docstring
+        row = {"sha256": sha256, "content_type": content_type, "filename": filename, "size_bytes": len(data), "conversation_id": conversation_id}
+        response = self.metadata_client.table(self.table).insert(row).execute()
+        if not response.data:
+            raise RuntimeError(f"No metadata row returned for attachment {filename or sha256[:12]}")
+        try:
+            self._write_blob(sha256, data)
+        except Exception:
+            self.metadata_client.table(self.table).delete().eq("id", response.data[0]["id"]).execute()
+            raise
+        attachment = {
+            "id": str(response.data[0]["id"]),
+            "sha256": sha256,
+            "content_type": content_type,
+            "filename": filename,
+            "size": len(data),
+            "data": data,
+        }
+        if self.cache is not None:
+            self.cache.put(attachment)
+        return attachment
+
+    def _unique_blobs(self, items: list[dict]) -> tuple[list[str], dict[str, bytes]]:
+        # Items may carry a hash computed while the upload was streamed
+        hashes = [item.get("sha256") or hashlib.sha256(item["data"]).hexdigest() for item in items]
+        # Identical files in the same upload share one blob write
+        unique_blobs = {sha256: item["data"] for sha256, item in zip(hashes, items)}
+        with self._lock:
+            self.blobs_deduplicated += len(items) - len(unique_blobs)
+        return hashes, unique_blobs
+
+    def put_many(self, items: list[dict]) -> list[dict]:
+        """
+        Stores several attachments with one bulk metadata insert.
+
+        Args:
+            items: Dicts with "data", "content_type" and optionally "filename", "sha256" of "data" and "conversation_id".
+
+        Returns:
+            One stored attachment dict per item, in the same order (see put()).
+        """
+        if not items:
+            return []
+        hashes, unique_blobs = self._unique_blobs(items)
+        # Rows before blobs, see the module docstring
+        attachments = self._insert_metadata(items, hashes)
+        try:
+            for sha256, data in unique_blobs.items():
+                self._write_blob(sha256, data)
+        except Exception:
+            self._remove_rows(attachments)
+            raise
+        return self._cached(attachments)
+
+    def _insert_metadata(self, items: list[dict], hashes: list[str]) -> list[dict]:
+        rows = [
+            {
+                "sha256": sha256,
+                "content_type": item.get("content_type"),
+                "filename": item.get("filename"),
+                "size_bytes": len(item["data"]),
+                "conversation_id": item.get("conversation_id"),
+            }
+            for sha256, item in zip(hashes, items)
+        ]
+        response = self.metadata_client.table(self.table).insert(rows).execute()
+        # PostgREST returns bulk-inserted rows in insert order
+        if not response.data or len(response.data) != len(rows):
+            raise RuntimeError(f"Expected {len(rows)} metadata rows, got {len(response.data or [])}")
+        attachments = [
+            {
+                "id": str(row["id"]),
+                "sha256": sha256,
+                "content_type": item.get("content_type"),
+                "filename": item.get("filename"),
+                "size": len(item["data"]),
+                "data": item["data"],
+            }
+            for row, sha256, item in zip(response.data, hashes, items)
+        ]
+        return attachments
+
+    def _cached(self, attachments: list[dict]) -> list[dict]:
+        if self.cache is not None:
+            for attachment in attachments:
+                self.cache.put(attachment)
+        return attachments
+
+    def _remove_rows(self, attachments: list[dict]) -> None:
+        """Deletes the metadata rows of attachments whose blobs could not be written."""
+        self.metadata_client.table(self.table).delete().in_("id", [attachment["id"] for attachment in attachments]).execute()
+
+    def get_many(self, attachment_ids: list[str]) -> list[dict]:
+        """
+        Loads attachments by ID in the requested order, from the cache when possible.
+        Unknown IDs and missing blobs are skipped.
+        """
+        if not attachment_ids:
+            return []
+        cached = {}
+        if self.cache is not None:
+            for attachment_id in attachment_ids:
+                attachment = self.cache.get(str(attachment_id))
+                if attachment is not None:
+                    cached[str(attachment_id)] = attachment
+
+        missing_ids = [str(attachment_id) for attachment_id in attachment_ids if str(attachment_id) not in cached]
+        rows_by_id = {}
+        if missing_ids:
+            response = (
+                self.metadata_client.table(self.table)
+                .select("id, sha256, content_type, filename, size_bytes")
+                .in_("id", missing_ids)
+                .execute()
+            )
+            rows_by_id = {str(row["id"]): row for row in response.data or []}
+
+        attachments = []
+        for attachment_id in attachment_ids:
+            if str(attachment_id) in cached:
+                attachments.append(cached[str(attachment_id)])
+                continue
+            row = rows_by_id.get(str(attachment_id))
+            if row is None:
+                continue
+            try:
+                data = self.backend.get(row["sha256"])
+            except Exception as e:
+                # One unreadable blob (missing file, storage API error) must not fail the whole turn
+                print(f"Error reading attachment blob {row['sha256'][:12]}: {e}")
+                continue
+            with self._lock:
+                self.bytes_read += len(data)
+            attachments.append({
+                "id": str(row["id"]),
+                "sha256": row["sha256"],
+                "content_type": row.get("content_type"),
+                "filename": row.get("filename"),
+                "size": row.get("size_bytes", len(data)),
+                "data": data,
+            })
+        return attachments
+
+    def mark_consumed(self, attachment_ids: list[str]) -> int:
+        """
+        Marks attachments as consumed (their turn has been answered) so the garbage collector
+        can delete them after the retention period. Returns the number of IDs marked.
+        """
+        attachment_ids = [str(attachment_id) for attachment_id in attachment_ids if attachment_id]
+        if not attachment_ids:
+            return 0
+        (
+            self.metadata_client.table(self.table)
+            .update({"consumed_at": datetime.now(timezone.utc).isoformat()})
+            .in_("id", attachment_ids)
+            .execute()
+        )
+        if self.cache is not None:
+            for attachment_id in attachment_ids:
+                self.cache.discard(attachment_id)
+        return len(attachment_ids)
+
+    async def aput(self, data: bytes, content_type: Optional[str], filename: Optional[str] = None, conversation_id: Optional[str] = None) -> dict:
+        return await asyncio.to_thread(self.put, data, content_type, filename, conversation_id)
+
+    async def aput_many(self, items: list[dict]) -> list[dict]:
+        """put_many() with the unique blobs uploaded concurrently after the bulk metadata insert."""
+        if not items:
+            return []
+        hashes, unique_blobs = self._unique_blobs(items)
+        attachments = await asyncio.to_thread(self._insert_metadata, items, hashes)
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._write_blob, sha256, data) for sha256, data in unique_blobs.items()),
+            return_exceptions=True,
+        )
+        failure = next((result for result in results if isinstance(result, BaseException)), None)
+        if failure is not None:
+            await asyncio.to_thread(self._remove_rows, attachments)
+            raise failure
+        return self._cached(attachments)
+
+    async def aget_many(self, attachment_ids: list[str]) -> list[dict]:
+        return await asyncio.to_thread(self.get_many, attachment_ids)
+
+    async def amark_consumed(self, attachment_ids: list[str]) -> int:
+        return await asyncio.to_thread(self.mark_consumed, attachment_ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "blobs_written": self.blobs_written,
+                "blobs_deduplicated": self.blobs_deduplicated,
+                "bytes_written": self.bytes_written,
+                "bytes_read": self.bytes_read,
+            }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
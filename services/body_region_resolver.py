@@ -0,0 +1,116 @@
+"""
+Deterministic fast path for the body scanner commander.
+
+The scanner commander only has to map the conversation to one of the BodyScannerCommand
+literals, which a lexicon lookup can usually do without a model call. BodyRegionResolver
+scores the regions mentioned in the last few turns (the latest turn and the user's own
+words weigh more, negated mentions are ignored) and returns a command with a confidence.
+Callers fall back to the LLM below 'threshold' and report the LLM's answer back through
+record_fallback(), which is how agreement with the LLM is tracked.
+"""
+from collections import defaultdict
+from typing import Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from services.context_manager import message_text, turn_start_indices
+from services.health_lexicon import SIDE_TERMS, SIDED_REGIONS, TERM_REGIONS, find_terms, is_negated, tokenize
+
+_REGION_VOCABULARY = frozenset(TERM_REGIONS)
+SIDE_WINDOW = 3
+
+
+class BodyRegionResolver:
+    """
+    Resolves a body scanner command from recent messages.
+
+    Args:
+        threshold: Minimum confidence for the resolver's command to be used without the LLM.
+        recent_turns: How many trailing turns are scored.
+        decay: Weight multiplier per turn of age (the latest user message weighs 1.0).
+        assistant_weight: Weight of Akasi's and tool messages relative to the user's in the same turn.
+    """
+
+    def __init__(self, threshold: float = 0.6, recent_turns: int = 2, decay: float = 0.5, assistant_weight: float = 0.5):
+        self.threshold = threshold
+        self.recent_turns = recent_turns
+        self.decay = decay
+        self.assistant_weight = assistant_weight
+        self.hits = 0
+        self.fallbacks = 0
+        self.compared = 0
+        self.agreed = 0
+
+    def _side(self, tokens: list[str], position: int) -> Optional[str]:
+        for token in tokens[max(0, position - SIDE_WINDOW):position + SIDE_WINDOW + 1]:
+            if token in SIDE_TERMS:
+                return SIDE_TERMS[token]
+        return None
+
+    def resolve(self, messages: list[BaseMessage]) -> dict:
+        """
+        Returns:
+            {"command": str or None, "confidence": float, "use_llm": bool}. 'command' is None
+            when no region is mentioned; limb regions without a side get half confidence.
+        """
+        scores: dict[str, float] = defaultdict(float)
+        sides: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        # Weights decay per turn, not per message, so the agent reply and tool output that
+        # follow the user's message do not push the user's own words down
+        starts = turn_start_indices(messages)[-self.recent_turns:] or [0]
+        weight = 1.0
+        for start, end in reversed(list(zip(starts, starts[1:] + [len(messages)]))):
+            for message in messages[start:end]:
+                message_weight = weight if isinstance(message, HumanMessage) else weight * self.assistant_weight
+                tokens = tokenize(message_text(message))
+                for position, term in find_terms(tokens, _REGION_VOCABULARY):
+                    if is_negated(tokens, position):
+                        continue
+                    region = TERM_REGIONS[term]
+                    scores[region] += message_weight
+                    side = self._side(tokens, position) if region in SIDED_REGIONS else None
+                    if side:
+                        sides[region][side] += message_weight
+            weight *= self.decay
+
+        if not scores:
+            return self._result(None, 0.0)
+
+        region, top = max(scores.items(), key=lambda item: item[1])
+        # Share of the evidence for the winning region, scaled down when the evidence is weak
+        confidence = (top / sum(scores.values())) * min(1.0, top)
+        command = region
+        if region in SIDED_REGIONS:
+            if sides[region]:
+                command = f"{max(sides[region].items(), key=lambda item: item[1])[0]} {region}"
+            else:
+                command = f"Right {region}"
+                confidence *= 0.5
+        return self._result(command, round(confidence, 3))
+
+    def _result(self, command: Optional[str], confidence: float) -> dict:
+        use_llm = command is None or confidence < self.threshold
+        if use_llm:
+            self.fallbacks += 1
+        else:
+            self.hits += 1
+        return {"command": command, "confidence": confidence, "use_llm": use_llm}
+
+    def record_fallback(self, resolution: dict, llm_command: str) -> None:
+        """Compares a low-confidence resolver guess with the LLM's command."""
+        if resolution.get("command") is None:
+            return
+        self.compared += 1
+        if resolution["command"] == llm_command:
+            self.agreed += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.fallbacks
+        return {
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "fallback_rate": round(self.fallbacks / total, 3) if total else 0.0,
+            "agreement_rate": round(self.agreed / self.compared, 3) if self.compared else None,
+            "threshold": self.threshold,
+        }
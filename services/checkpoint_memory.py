@@ -0,0 +1,347 @@
+"""
+Bounded in-memory checkpoint storage for the LangGraph agent.
+
+MemorySaver keeps every thread forever and a full snapshot for every super-step.
+BoundedMemorySaver keeps the same storage layout but:
+
+* tracks when each thread was last touched and roughly how many bytes it holds, and
+  evicts threads that are idle past a TTL or least recently used threads when the
+  thread count or the per-process memory budget is exceeded;
+* optionally keeps only the latest N checkpoints per thread (older checkpoints, their
+  pending writes and any channel blobs no longer referenced are dropped);
+* optionally stores the "messages" channel as a delta against its previous version
+  instead of a full copy of the history;
+* can run a periodic sweeper that reports the bytes reclaimed per thread.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+
+DELTA_BLOB_PREFIX = "delta:"
+_MISSING = object()
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate byte size of serialized checkpoint data (bytes nested in tuples/dicts)."""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_sizeof(item) for item in value.values())
+    return 0
+
+
+def _message_signature(message: Any) -> tuple:
+    """Cheap identity of a message used to detect which entries changed between versions."""
+    return (getattr(message, "id", None), hash(str(getattr(message, "content", message))), hash(str(getattr(message, "tool_calls", ""))))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver with LRU/TTL eviction, a per-process memory budget and a retention policy.
+
+    Args:
+        max_threads: Maximum number of conversation threads kept in memory.
+        ttl_seconds: Threads idle for longer than this are dropped.
+        max_bytes: Approximate memory budget for all stored checkpoints.
+        keep_latest: Checkpoints kept per thread/namespace (None keeps all).
+        store_message_deltas: Store the messages channel as deltas against the previous version.
+        full_snapshot_every: Maximum delta chain length before a full copy is stored again.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 500,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        keep_latest: Optional[int] = None,
+        store_message_deltas: bool = False,
+        full_snapshot_every: int = 8,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.keep_latest = keep_latest
+        # Deltas rely on MemorySaver resolving channel values through _load_blobs
+        self.store_message_deltas = store_message_deltas and hasattr(MemorySaver, "_load_blobs")
+        self.delta_channels = ("messages",)
+        self.full_snapshot_every = full_snapshot_every
+
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        self._thread_bytes: dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.evicted_threads = 0
+        self.evicted_bytes = 0
+
+        # Retention bookkeeping, keyed by (thread_id, checkpoint_ns)
+        self._checkpoint_versions: dict[tuple, dict[str, dict]] = defaultdict(dict)
+        self._blob_keys: dict[tuple, set] = defaultdict(set)
+        # Delta bookkeeping: blob key -> base blob key / chain depth, and the latest version per channel
+        self._delta_base: dict[tuple, tuple] = {}
+        self._delta_depth: dict[tuple, int] = {}
+        self._latest_channel: dict[tuple, tuple[str, list]] = {}
+
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    # --- Access tracking and eviction ---
+    def _touch(self, thread_id: str) -> None:
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _drop_thread(self, thread_id: str) -> int:
+        """Removes every checkpoint, write and blob of a thread. Returns the bytes released."""
+        self.storage.pop(thread_id, None)
+        for key in [k for k in self.writes if k[0] == thread_id]:
+            del self.writes[key]
+        blobs = getattr(self, "blobs", None)
+        if blobs is not None:
+            for key in [k for k in blobs if k[0] == thread_id]:
+                del blobs[key]
+        for bookkeeping in (self._checkpoint_versions, self._blob_keys, self._latest_channel):
+            for key in [k for k in bookkeeping if k[0] == thread_id]:
+                del bookkeeping[key]
+        for bookkeeping in (self._delta_base, self._delta_depth):
+            for key in [k for k in bookkeeping if k[0] == thread_id]:
+                del bookkeeping[key]
+        self._last_access.pop(thread_id, None)
+        return self._thread_bytes.pop(thread_id, 0)
+
+    def _evict(self, keep: Optional[str] = None) -> dict[str, int]:
+        """Applies TTL and LRU/budget eviction. Returns bytes released per evicted thread."""
+        released: dict[str, int] = {}
+        now = time.monotonic()
+        expired = [tid for tid, seen in self._last_access.items() if now - seen > self.ttl_seconds and tid != keep]
+        for thread_id in expired:
+            released[thread_id] = self._drop_thread(thread_id)
+
+        while self._last_access and (len(self._last_access) > self.max_threads or self.total_bytes > self.max_bytes):
+            oldest = next(iter(self._last_access))
+            if oldest == keep:
+                # Only the active thread is left over budget; keep it rather than losing the live turn
+                if len(self._last_access) == 1:
+                    break
+                self._last_access.move_to_end(oldest)
+                oldest = next(iter(self._last_access))
+            released[oldest] = self._drop_thread(oldest)
+
+        self.evicted_threads += len(released)
+        self.evicted_bytes += sum(released.values())
+        return released
+
+    # --- Retention ---
+    def _referenced_blob_keys(self, thread_id: str, checkpoint_ns: str) -> set:
+        referenced = set()
+        for versions in self._checkpoint_versions[(thread_id, checkpoint_ns)].values():
+            for channel, version in versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                # A delta blob keeps its whole base chain alive
+                while key is not None and key not in referenced:
+                    referenced.add(key)
+                    key = self._delta_base.get(key)
+        return referenced
+
+    def _apply_retention(self, thread_id: str, checkpoint_ns: str) -> int:
+        """Drops checkpoints beyond keep_latest and blobs nothing references. Returns bytes reclaimed."""
+        if not self.keep_latest:
+            return 0
+        checkpoints = self.storage.get(thread_id, {}).get(checkpoint_ns)
+        if not checkpoints or len(checkpoints) <= self.keep_latest:
+            return 0
+
+        reclaimed = 0
+        versions_by_checkpoint = self._checkpoint_versions[(thread_id, checkpoint_ns)]
+        for checkpoint_id in sorted(checkpoints)[:-self.keep_latest]:
+            reclaimed += _sizeof(checkpoints.pop(checkpoint_id))
+            reclaimed += _sizeof(self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None))
+            versions_by_checkpoint.pop(checkpoint_id, None)
+
+        blobs = getattr(self, "blobs", None)
+        if blobs is not None:
+            referenced = self._referenced_blob_keys(thread_id, checkpoint_ns)
+            blob_keys = self._blob_keys[(thread_id, checkpoint_ns)]
+            for key in [k for k in blob_keys if k not in referenced]:
+                reclaimed += _sizeof(blobs.pop(key, None))
+                blob_keys.discard(key)
+                self._delta_base.pop(key, None)
+                self._delta_depth.pop(key, None)
+
+        self._thread_bytes[thread_id] = max(0, self._thread_bytes.get(thread_id, 0) - reclaimed)
+        return reclaimed
+
+    # --- Message deltas ---
+    def _store_deltas(self, thread_id: str, checkpoint_ns: str, checkpoint, new_versions) -> None:
+        values = checkpoint.get("channel_values", {})
+        for channel in self.delta_channels:
+            if channel not in new_versions or not isinstance(values.get(channel), list):
+                continue
+            key = (thread_id, checkpoint_ns, channel, new_versions[channel])
+            messages = values[channel]
+            signatures = [_message_signature(m) for m in messages]
+            previous = self._latest_channel.get((thread_id, checkpoint_ns, channel))
+            self._latest_channel[(thread_id, checkpoint_ns, channel)] = (new_versions[channel], signatures)
+            if previous is None:
+                continue
+
+            previous_version, previous_signatures = previous
+            base_key = (thread_id, checkpoint_ns, channel, previous_version)
+            depth = self._delta_depth.get(base_key, 0) + 1
+            previous_ids = [s[0] for s in previous_signatures]
+            # Deltas only cover "same order, some replaced, some appended"; anything else is stored in full
+            if (
+                base_key not in self.blobs
+                or depth > self.full_snapshot_every
+                or None in previous_ids
+                or [s[0] for s in signatures[:len(previous_ids)]] != previous_ids
+            ):
+                continue
+
+            changed = [
+                message for index, message in enumerate(messages)
+                if index >= len(previous_signatures) or signatures[index] != previous_signatures[index]
+            ]
+            inner_type, payload = self.serde.dumps_typed([previous_version, changed])
+            self.blobs[key] = (f"{DELTA_BLOB_PREFIX}{inner_type}", payload)
+            self._delta_base[key] = base_key
+            self._delta_depth[key] = depth
+
+    def _load_blob_value(self, key: tuple):
+        blob = self.blobs.get(key)
+        if blob is None or blob[0] == "empty":
+            return _MISSING
+        if not blob[0].startswith(DELTA_BLOB_PREFIX):
+            return self.serde.loads_typed(blob)
+
+        base_version, changed = self.serde.loads_typed((blob[0][len(DELTA_BLOB_PREFIX):], blob[1]))
+        base = self._load_blob_value((key[0], key[1], key[2], base_version))
+        messages = list(base) if base is not _MISSING else []
+        positions = {getattr(m, "id", None): i for i, m in enumerate(messages)}
+        for message in changed:
+            index = positions.get(getattr(message, "id", None))
+            if index is None:
+                messages.append(message)
+            else:
+                messages[index] = message
+        return messages
+
+    def _load_blobs(self, thread_id, checkpoint_ns, versions):
+        if not self.store_message_deltas:
+            return super()._load_blobs(thread_id, checkpoint_ns, versions)
+        channel_values = {}
+        for channel, version in versions.items():
+            value = self._load_blob_value((thread_id, checkpoint_ns, channel, version))
+            if value is not _MISSING:
+                channel_values[channel] = value
+        return channel_values
+
+    # --- MemorySaver overrides (the async variants delegate to these) ---
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        with self._lock:
+            results = [checkpoint_tuple for checkpoint_tuple in super().list(config, **kwargs)]
+        yield from results
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            if self.store_message_deltas:
+                self._store_deltas(thread_id, checkpoint_ns, checkpoint, new_versions)
+
+            added = _sizeof(self.storage[thread_id][checkpoint_ns].get(checkpoint["id"]))
+            blobs = getattr(self, "blobs", {})
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                added += _sizeof(blobs.get(key))
+                self._blob_keys[(thread_id, checkpoint_ns)].add(key)
+            self._checkpoint_versions[(thread_id, checkpoint_ns)][checkpoint["id"]] = dict(checkpoint.get("channel_versions", {}))
+            self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + added
+
+            self._apply_retention(thread_id, checkpoint_ns)
+            self._touch(thread_id)
+            self._evict(keep=thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        thread_id = config["configurable"]["thread_id"]
+        key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+        with self._lock:
+            before = _sizeof(self.writes.get(key))
+            result = super().put_writes(config, writes, task_id, *args, **kwargs)
+            after = _sizeof(self.writes.get(key))
+            self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + (after - before)
+            self._touch(thread_id)
+            return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop_thread(thread_id)
+
+    # --- Sweeper ---
+    def sweep(self) -> dict:
+        """
+        Applies TTL eviction and the retention policy to every thread.
+
+        Returns:
+            Bytes reclaimed per thread, the total, and how long the sweep took.
+        """
+        started_at = time.perf_counter()
+        with self._lock:
+            reclaimed = self._evict()
+            for thread_id in list(self.storage.keys()):
+                for checkpoint_ns in list(self.storage[thread_id].keys()):
+                    freed = self._apply_retention(thread_id, checkpoint_ns)
+                    if freed:
+                        reclaimed[thread_id] = reclaimed.get(thread_id, 0) + freed
+        return {
+            "reclaimed_bytes_by_thread": reclaimed,
+            "reclaimed_bytes": sum(reclaimed.values()),
+            "duration_seconds": time.perf_counter() - started_at,
+        }
+
+    async def run_sweeper(self, interval_seconds: float, on_report: Optional[Callable[[dict], None]] = None) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                report = self.sweep()
+                if on_report and report["reclaimed_bytes"]:
+                    on_report(report)
+            except Exception as e:
+                print(f"Error in checkpoint sweeper: {e}")
+
+    def ensure_sweeper(self, interval_seconds: float, on_report: Optional[Callable[[dict], None]] = None) -> None:
+        """Starts the periodic sweeper on the running event loop if it is not already running."""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self.run_sweeper(interval_seconds, on_report))
+
+    # --- Stats ---
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._thread_bytes.values())
+
+    def stats(self) -> dict:
+        """Returns thread count, approximate bytes held and eviction counters."""
+        with self._lock:
+            return {
+                "threads": len(self._last_access),
+                "bytes": self.total_bytes,
+                "evicted_threads": self.evicted_threads,
+                "evicted_bytes": self.evicted_bytes,
+            }
@@ -0,0 +1,231 @@
+"""
+Token-budgeted context assembly for the Akasi.ai graph nodes.
+
+Each node declares a ContextPolicy (token budget, how many recent turns it needs and
+whether it wants the rolling summary). ContextManager selects the most recent whole
+turns that fit the budget and folds older turns into a rolling summary that is kept
+in the graph state and extended incrementally, so per-turn prompt size stays flat
+instead of growing with the whole session.
+
+Folding runs in the background after a turn is answered (schedule_fold) and the
+finished summary is picked up by the next turn (take_fold), so the summarizer never
+adds a round trip to a reply. Until then, the turns it does not cover yet are still
+selected for the prompt.
+"""
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Rough Claude vision cost for one attached image; text is estimated at ~4 characters per token
+IMAGE_TOKEN_ESTIMATE = 1600
+CHARS_PER_TOKEN = 4
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Approximate token count of plain text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_message_tokens(message: BaseMessage) -> int:
+    """Approximate token count of a single message (text, image blocks and tool calls)."""
+    content = message.content
+    chars = 0
+    images = 0
+    if isinstance(content, str):
+        chars += len(content)
+    elif isinstance(content, list):
+        for part in content:
+            if isinstance(part, str):
+                chars += len(part)
+            elif isinstance(part, dict):
+                if part.get("type") in ("image", "image_url"):
+                    images += 1
+                else:
+                    chars += len(str(part.get("text", "")))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        chars += len(tool_call.get("name", "")) + len(json.dumps(tool_call.get("args", {}), default=str))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKEN_ESTIMATE + 4
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    """Approximate token count of a message list."""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def message_text(message: BaseMessage) -> str:
+    """Plain text of a message with image blocks replaced by a marker."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict):
+            if part.get("type") in ("image", "image_url"):
+                parts.append("[image]")
+            elif part.get("text"):
+                parts.append(str(part["text"]))
+    return " ".join(parts)
+
+
+def messages_to_transcript(messages: list[BaseMessage]) -> str:
+    """Renders messages as a compact 'Role: text' transcript for summarization."""
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "User"
+        elif isinstance(message, AIMessage):
+            role = "Akasi"
+        elif isinstance(message, ToolMessage):
+            role = "Tool"
+        else:
+            role = message.type.title()
+        text = message_text(message).strip()
+        if text:
+            lines.append(f"{role}: {text}")
+    return "\n".join(lines)
+
+
+def turn_start_indices(messages: list[BaseMessage]) -> list[int]:
+    """Indices of messages that start a turn (each HumanMessage starts one)."""
+    return [index for index, message in enumerate(messages) if isinstance(message, HumanMessage)]
+
+
+class ContextPolicy:
+    """
+    Declares what a node needs from the conversation.
+
+    Args:
+        name: Node name, used for reporting.
+        token_budget: Upper bound for the estimated tokens of the selected history.
+        recent_turns: Maximum number of most recent turns to include. Policies that include the
+            summary also get every turn not yet folded into it (see ContextManager.select_history).
+        include_summary: Whether the rolling summary of older turns is prepended.
+    """
+
+    def __init__(self, name: str, token_budget: int, recent_turns: int, include_summary: bool = True):
+        self.name = name
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.include_summary = include_summary
+
+
+class ContextManager:
+    """
+    Builds per-node prompts from the conversation and maintains the rolling summary.
+
+    Args:
+        summarize: Async callable (previous_summary, transcript) -> new summary.
+        keep_recent_turns: Turns that are never folded into the summary. A turn is folded
+            once it leaves this window; until its fold has landed it is still among the
+            turns that summary-including policies select.
+        max_pending_folds: Background folds kept for conversations whose next turn has not come yet.
+    """
+
+    def __init__(self, summarize: Callable[[str, str], Awaitable[str]], keep_recent_turns: int = 6, max_pending_folds: int = 1000):
+        self.summarize = summarize
+        self.keep_recent_turns = keep_recent_turns
+        self.max_pending_folds = max_pending_folds
+        self.last_token_counts: dict[str, int] = {}
+        # conversation key -> (summarized_count the fold started from, fold task)
+        self._folds: "OrderedDict[str, tuple[int, asyncio.Task]]" = OrderedDict()
+
+    async def refresh_summary(self, messages: list[BaseMessage], summary: Optional[str], summarized_count: Optional[int]) -> tuple[str, int]:
+        """
+        Folds turns older than the recent window into the rolling summary.
+
+        Returns:
+            The (possibly unchanged) summary and the number of leading messages it covers.
+        """
+        summary = summary or ""
+        summarized_count = summarized_count or 0
+        starts = turn_start_indices(messages)
+        if len(starts) <= self.keep_recent_turns:
+            return summary, summarized_count
+
+        fold_until = starts[-self.keep_recent_turns]
+        pending = messages[summarized_count:fold_until]
+        if not pending:
+            return summary, summarized_count
+
+        try:
+            new_summary = await self.summarize(summary, messages_to_transcript(pending))
+        except Exception as e:
+            print(f"Error updating rolling conversation summary: {e}")
+            return summary, summarized_count
+        return (new_summary or summary), fold_until
+
+    def schedule_fold(self, key: str, messages: list[BaseMessage], summary: Optional[str], summarized_count: Optional[int]) -> None:
+        """
+        Starts refresh_summary in the background for an answered turn, unless a fold for
+        this conversation is already running or nothing has left the recent window.
+        """
+        pending = self._folds.get(key)
+        if pending is not None and not pending[1].done():
+            return
+        starts = turn_start_indices(messages)
+        if len(starts) <= self.keep_recent_turns or starts[-self.keep_recent_turns] <= (summarized_count or 0):
+            return
+        task = asyncio.create_task(self.refresh_summary(messages, summary, summarized_count))
+        self._folds[key] = (summarized_count or 0, task)
+        self._folds.move_to_end(key)
+        while len(self._folds) > self.max_pending_folds:
+            _, (_, oldest_task) = self._folds.popitem(last=False)
+            oldest_task.cancel()
+
+    def take_fold(self, key: str, summary: Optional[str], summarized_count: Optional[int]) -> tuple[str, int]:
+        """
+        Summary and covered message count to use for this turn: the finished background
+        fold if one started from the same state, otherwise the given values. Never waits.
+        """
+        summary = summary or ""
+        summarized_count = summarized_count or 0
+        pending = self._folds.get(key)
+        if pending is None or not pending[1].done():
+            return summary, summarized_count
+        del self._folds[key]
+        base_count, task = pending
+        if task.cancelled() or base_count != summarized_count:
+            return summary, summarized_count
+        return task.result()
+
+    def select_history(self, messages: list[BaseMessage], policy: ContextPolicy, summarized_count: Optional[int] = None) -> list[BaseMessage]:
+        """
+        Most recent whole turns allowed by the policy's turn count and token budget.
+        Policies that include the summary consider every turn from 'summarized_count' on
+        (at least the recent window), so a turn that is not in the summary yet is only
+        dropped for the token budget.
+        """
+        starts = turn_start_indices(messages)
+        if not starts:
+            return list(messages)
+
+        recent_turns = policy.recent_turns
+        if policy.include_summary:
+            unsummarized_turns = sum(1 for start in starts if start >= (summarized_count or 0))
+            recent_turns = max(recent_turns, self.keep_recent_turns, unsummarized_turns)
+        starts = starts[-recent_turns:] if recent_turns > 0 else starts[-1:]
+        selected = messages[starts[0]:]
+        # Drop whole turns from the front until within budget; the latest turn is always kept
+        for start in starts[1:]:
+            if estimate_tokens(selected) <= policy.token_budget:
+                break
+            selected = messages[start:]
+        return list(selected)
+
+    def assemble(self, messages: list[BaseMessage], policy: ContextPolicy, system_prompt: str, summary: Optional[str] = None, summarized_count: Optional[int] = None) -> list[BaseMessage]:
+        """
+        Builds the message list for a node: system prompt (plus summary) followed by
+        the selected history. Records the estimated token count under the policy name.
+        """
+        system_content = system_prompt
+        if policy.include_summary and summary:
+            system_content = f"{system_prompt}\n\n**Summary of the earlier conversation:**\n{summary}"
+
+        assembled = [SystemMessage(content=system_content)] + self.select_history(messages, policy, summarized_count)
+        self.last_token_counts[policy.name] = estimate_tokens(assembled)
+        return assembled
@@ -0,0 +1,123 @@
+"""
+Symptom, body-part and body-region vocabulary for the local (non-LLM) conversation filters.
+
+Covers the English and Filipino/Taglish words patients use with Akasi. Terms are
+matched on normalized tokens; multi-word terms are matched as token sequences.
+A term is negated when one of NEGATION_TERMS appears within NEGATION_WINDOW
+tokens before it ("no fever", "wala nang sakit").
+"""
+import re
+
+_TOKEN_RE = re.compile(r"[a-zñ0-9'-]+")
+
+SYMPTOM_TERMS = frozenset({
+    # English
+    "pain", "painful", "ache", "aches", "aching", "hurt", "hurts", "hurting", "sore", "soreness",
+    "fever", "feverish", "cough", "coughing", "cold", "flu", "headache", "migraine", "dizzy",
+    "dizziness", "nausea", "nauseous", "vomit", "vomiting", "diarrhea", "constipation", "rash",
+    "itch", "itchy", "itching", "swelling", "swollen", "bleeding", "blood", "bruise", "bruised",
+    "burn", "burning", "cramp", "cramps", "tired", "fatigue", "weak", "weakness", "numb",
+    "numbness", "tingling", "insomnia", "sleep", "anxiety", "anxious", "stress", "stressed",
+    "depressed", "sad", "allergy", "allergic", "infection", "wound", "cut", "injury", "injured",
+    "sprain", "sprained", "fracture", "breathless", "wheezing", "chills", "sweating", "stiff",
+    "stiffness", "lump", "pimple", "acne", "bloated", "bloating", "heartburn", "palpitations",
+    "symptom", "symptoms", "medicine", "medication", "tablet", "prescription", "doctor",
+    "better", "worse", "improving", "recovered", "healed",
+    # Filipino / Taglish
+    "sakit", "masakit", "kirot", "makirot", "lagnat", "nilalagnat", "ubo", "inuubo", "sipon",
+    "trangkaso", "hilo", "nahihilo", "suka", "nagsusuka", "pagtatae", "tae", "kati", "makati",
+    "pantal", "pamamaga", "namamaga", "maga", "dugo", "dumudugo", "pasa", "paso", "pulikat",
+    "pagod", "pagod na", "mahina", "manhid", "pamamanhid", "puyat", "hindi makatulog",
+    "kaba", "kinakabahan", "lungkot", "malungkot", "sugat", "bali", "pilay", "hingal",
+    "hinihingal", "ginaw", "nginig", "pawis", "bukol", "tigyawat", "kabag", "hapdi", "mahapdi",
+    "gamot", "doktor", "gumaling", "magaling na", "lumala",
+})
+
+BODY_PART_TERMS = frozenset({
+    # English
+    "head", "forehead", "temple", "face", "eye", "eyes", "ear", "ears", "nose", "mouth", "tooth",
+    "teeth", "throat", "neck", "shoulder", "shoulders", "chest", "breast", "lung", "lungs",
+    "heart", "back", "spine", "stomach", "belly", "abdomen", "tummy", "pelvis", "hip", "hips",
+    "arm", "arms", "elbow", "wrist", "hand", "hands", "finger", "fingers", "leg", "legs",
+    "thigh", "knee", "knees", "ankle", "foot", "feet", "toe", "toes", "skin", "body",
+    # Filipino / Taglish
+    "ulo", "noo", "mukha", "mata", "tenga", "tainga", "ilong", "bibig", "ngipin", "lalamunan",
+    "leeg", "balikat", "dibdib", "baga", "puso", "likod", "tiyan", "sikmura", "puson",
+    "balakang", "braso", "siko", "pulso", "kamay", "daliri", "binti", "hita", "tuhod",
+    "bukung-bukong", "paa", "talampakan", "balat", "katawan",
+})
+
+# Body scanner regions. Limb regions ("Arm", "Leg", ...) are completed with a side
+# ("Left Arm") by SIDE_TERMS found next to the term.
+REGION_TERMS = {
+    "Head": ("head", "headache", "migraine", "forehead", "temple", "face", "eye", "eyes", "ear", "ears",
+             "nose", "mouth", "tooth", "teeth", "toothache", "ulo", "noo", "mukha", "mata", "tenga",
+             "tainga", "ilong", "bibig", "ngipin", "hilo", "nahihilo", "dizzy", "dizziness"),
+    "Neck": ("neck", "throat", "leeg", "lalamunan", "tonsils", "stiff neck"),
+    "Thorax": ("chest", "ribs", "rib", "breast", "dibdib", "tadyang"),
+    "Lungs": ("lung", "lungs", "cough", "coughing", "breath", "breathing", "breathless", "wheezing",
+              "asthma", "phlegm", "baga", "ubo", "inuubo", "hika", "plema", "hingal", "hinihingal"),
+    "Heart": ("heart", "palpitations", "heartbeat", "puso", "kabog"),
+    "Abdominal and Pelvic Region": ("stomach", "belly", "abdomen", "tummy", "pelvis", "bladder", "kidney",
+                                    "liver", "diarrhea", "constipation", "bloated", "bloating", "heartburn",
+                                    "tiyan", "sikmura", "puson", "pantog", "bato", "atay", "kabag",
+                                    "pagtatae", "regla", "period", "cramps"),
+    "Shoulder": ("shoulder", "shoulders", "balikat"),
+    "Arm": ("arm", "arms", "elbow", "braso", "siko"),
+    "Hand": ("hand", "hands", "wrist", "finger", "fingers", "kamay", "pulso", "daliri"),
+    "Leg": ("leg", "legs", "thigh", "knee", "knees", "binti", "hita", "tuhod", "hip", "balakang"),
+    "Foot": ("foot", "feet", "ankle", "toe", "toes", "paa", "talampakan", "bukung-bukong"),
+    "FULL_BODY_GLOW": ("fever", "feverish", "fatigue", "chills", "flu", "whole body", "body aches",
+                       "lagnat", "nilalagnat", "trangkaso", "ginaw", "pagod", "katawan", "buong katawan"),
+}
+SIDED_REGIONS = frozenset({"Shoulder", "Arm", "Hand", "Leg", "Foot"})
+SIDE_TERMS = {
+    "left": "Left", "kaliwa": "Left", "kaliwang": "Left",
+    "right": "Right", "kanan": "Right", "kanang": "Right",
+}
+TERM_REGIONS = {term: region for region, terms in REGION_TERMS.items() for term in terms}
+
+# Words that mean the user is talking about the journal itself
+JOURNAL_TERMS = frozenset({
+    "journal", "entry", "entries", "log", "record", "note", "remove", "delete", "update",
+    "tanggalin", "burahin", "isulat", "ilista",
+})
+
+NEGATION_TERMS = frozenset({
+    "no", "not", "never", "without", "none", "dont", "don't", "didnt", "didn't", "isnt", "isn't",
+    "wala", "walang", "wala nang", "hindi", "di", "huwag", "hinde",
+})
+NEGATION_WINDOW = 3
+
+# Words a bare yes/no answer is made of ("yes", "no not anymore", "opo", "wala na po")
+ANSWER_TERMS = frozenset({
+    "yes", "yeah", "yep", "yup", "no", "nope", "nah", "not", "anymore", "still", "sometimes",
+    "oo", "opo", "oho", "hindi", "hinde", "di", "wala", "meron", "mayroon", "pa", "na", "po", "naman",
+})
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; hyphenated words are kept whole."""
+    return [token.strip("-'") for token in _TOKEN_RE.findall((text or "").lower()) if token.strip("-'")]
+
+
+def find_terms(tokens: list[str], vocabulary: frozenset) -> list[tuple[int, str]]:
+    """(position, term) for every single or two-word term of 'vocabulary' found in 'tokens'."""
+    found = []
+    for index, token in enumerate(tokens):
+        if index + 1 < len(tokens):
+            pair = f"{token} {tokens[index + 1]}"
+            if pair in vocabulary:
+                found.append((index, pair))
+                continue
+        if token in vocabulary:
+            found.append((index, token))
+    return found
+
+
+def is_negated(tokens: list[str], position: int) -> bool:
+    """True if a negation word appears within NEGATION_WINDOW tokens before 'position'."""
+    window = tokens[max(0, position - NEGATION_WINDOW):position]
+    return any(token in NEGATION_TERMS for token in window) or any(
+        f"{first} {second}" in NEGATION_TERMS for first, second in zip(window, window[1:])
+    )
@@ -0,0 +1,148 @@
+"""
+Server-side normalization of uploaded images before they reach Bedrock.
+
+Phone photos of lab sheets arrive at full resolution with EXIF metadata. Each image is
+decoded, auto-oriented from its EXIF tag, downscaled so its longest edge fits a
+configurable maximum and re-encoded as a compact JPEG or WebP without metadata. The
+CPU-heavy work runs in a process pool so it never blocks the event loop; uploads are
+passed to the pool by file path (normalize_file) so the original bytes are not pickled
+across the process boundary.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow missing: uploads pass through unchanged
+    Image = None
+    ImageOps = None
+
+NORMALIZABLE_CONTENT_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff", "image/heic"}
+
+
+def normalize_image_bytes(raw: bytes, content_type: str, max_edge: int = 1568, output_format: str = "JPEG", quality: int = 85) -> dict:
+    """
+    Decodes, orients, downscales and re-encodes one image. Runs inside a worker process.
+
+    Returns:
+        A dict with the resulting bytes, content type, sizes and dimensions. The
+        original bytes are returned when the image cannot (or need not) be rewritten.
+    """
+    result = _normalize(io.BytesIO(raw), len(raw), content_type, max_edge, output_format, quality)
+    if not result["normalized"]:
+        result["data"] = raw
+    return result
+
+
+def normalize_image_file(path: str, content_type: str, max_edge: int = 1568, output_format: str = "JPEG", quality: int = 85) -> dict:
+    """
+    normalize_image_bytes() for an image on disk. Runs inside a worker process.
+    "data" is None when the image is not rewritten; the original stays at 'path'.
+    """
+    return _normalize(path, os.path.getsize(path), content_type, max_edge, output_format, quality)
+
+
+def _normalize(source, original_size: int, content_type: str, max_edge: int, output_format: str, quality: int) -> dict:
+    result = {"data": None, "content_type": content_type, "original_size": original_size, "normalized_size": original_size, "normalized": False}
+    if Image is None:
+        return result
+
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            original_dimensions = img.size
+            if max(img.size) > max_edge:
+                img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            if img.mode in ("RGBA", "LA", "P") and output_format == "JPEG":
+                # JPEG has no alpha: flatten transparent scans onto white
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                rgba = img.convert("RGBA")
+                background.paste(rgba, mask=rgba.split()[-1])
+                img = background
+            elif img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            buffer = io.BytesIO()
+            img.save(buffer, format=output_format, quality=quality, optimize=True)
+            encoded = buffer.getvalue()
+            resized = img.size != original_dimensions
+    except Exception as e:
+        print(f"Image normalization skipped ({content_type}): {e}")
+        return result
+
+    # Re-encoding a small, already compact image can make it bigger; keep the original then
+    if not resized and len(encoded) >= original_size:
+        return result
+
+    result.update({
+        "data": encoded,
+        "content_type": f"image/{output_format.lower()}",
+        "normalized_size": len(encoded),
+        "normalized": True,
+        "width": img.size[0],
+        "height": img.size[1],
+    })
+    return result
+
+
+class ImageNormalizer:
+    """
+    Runs normalize_image_bytes / normalize_image_file in a lazily created process pool.
+
+    Args:
+        max_edge: Longest edge, in pixels, after downscaling.
+        output_format: "JPEG" or "WEBP".
+        quality: Encoder quality (1-100).
+        max_workers: Process pool size.
+    """
+
+    def __init__(self, max_edge: int = 1568, output_format: str = "JPEG", quality: int = 85, max_workers: int = 2):
+        self.max_edge = max_edge
+        self.output_format = output_format.upper()
+        self.quality = quality
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def normalize(self, raw: bytes, content_type: Optional[str]) -> dict:
+        """Normalizes image bytes off the event loop; non-image content passes through unchanged."""
+        content_type = (content_type or "").lower()
+        if not self.available or content_type not in NORMALIZABLE_CONTENT_TYPES:
+            return {"data": raw, "content_type": content_type, "original_size": len(raw), "normalized_size": len(raw), "normalized": False}
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_pool(), normalize_image_bytes, raw, content_type, self.max_edge, self.output_format, self.quality
+        )
+
+    async def normalize_file(self, path: str, content_type: Optional[str]) -> dict:
+        """
+        Normalizes an image file off the event loop. Only the path goes to the worker process;
+        "data" is None when the file is left as is.
+        """
+        content_type = (content_type or "").lower()
+        if not self.available or content_type not in NORMALIZABLE_CONTENT_TYPES:
+            size = os.path.getsize(path)
+            return {"data": None, "content_type": content_type, "original_size": size, "normalized_size": size, "normalized": False}
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_pool(), normalize_image_file, path, content_type, self.max_edge, self.output_format, self.quality
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,123 @@
+"""
+Content-addressed cache for medical image summaries.
+
+Summaries are keyed by the SHA-256 of the decoded image bytes and media type (see
+services.message_transforms.image_content_hash). A set of images is keyed by the
+ordered hashes of its members. Entries live in an in-memory LRU tier and, when a
+directory is configured, in an on-disk tier that survives restarts.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from services.message_transforms import image_content_hash
+
+
+def image_set_key(images: list[dict]) -> Optional[str]:
+    """
+    Cache key for a list of {"data": base64, "media_type": ...} dicts.
+    A single image uses its own content hash; several images hash their ordered member hashes.
+    """
+    member_hashes = [
+        image_content_hash(image["data"], image.get("media_type", "image/jpeg"))
+        for image in images
+        if image.get("data")
+    ]
+    return image_hashes_key(member_hashes)
+
+
+def image_hashes_key(member_hashes: list[str]) -> Optional[str]:
+    if not member_hashes:
+        return None
+    if len(member_hashes) == 1:
+        return member_hashes[0]
+    return hashlib.sha256("set:".join(member_hashes).encode("utf-8")).hexdigest()
+
+
+class ImageSummaryCache:
+    """
+    Two-tier (memory LRU + optional disk) cache of image summaries.
+
+    Args:
+        max_entries: Maximum number of summaries kept in memory.
+        disk_dir: Directory for the persistent tier, or None to disable it.
+    """
+
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.txt")
+
+    def _remember(self, key: str, summary: str) -> None:
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Returns the cached summary for a key, checking memory first, then disk."""
+        if not key:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                    summary = f.read()
+                with self._lock:
+                    self._remember(key, summary)
+                    self.disk_hits += 1
+                return summary
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error reading image summary cache entry {key}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Optional[str], summary: str) -> None:
+        """Stores a summary in memory and, if configured, on disk (atomic rename)."""
+        if not key or not summary:
+            return
+        with self._lock:
+            self._remember(key, summary)
+        if self.disk_dir:
+            tmp_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(summary)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                print(f"Error writing image summary cache entry {key}: {e}")
+
+    def lookup_for_hashes(self, member_hashes: list[str]) -> Optional[str]:
+        """Summary for already-hashed images; usable as a message_transforms summary_lookup."""
+        return self.get(image_hashes_key(member_hashes))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
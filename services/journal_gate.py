@@ -0,0 +1,170 @@
+"""
+Local pre-filter in front of the wellness journal controller.
+
+Most turns ("thanks", "ok", "hello") cannot change the journal, but the controller is
+a full Bedrock call that usually answers NONE. JournalGate judges the user's message and
+any tool output of the turn and decides in microseconds whether the journal workflow
+should run. Akasi's own replies are full of health words, so they are not judged; the
+previous reply is only used to interpret a bare yes/no answer:
+
+0. Turns with attachments always pass; an image-only turn has no text to judge.
+1. Journal words ("remove that entry") or non-negated symptom/body-part terms pass.
+2. Negated symptom terms ("wala nang lagnat") pass only when the journal has entries,
+   since they can resolve an existing entry; otherwise they are ignored.
+3. Everything else is scored by a small naive Bayes classifier trained on SEED_EXAMPLES.
+   Its threshold is calibrated so that at least 'recall_target' of the positive seed
+   examples pass, i.e. the gate errs towards running the controller.
+4. A bare yes/no answer ("yes", "wala na po") passes when Akasi's previous reply asked
+   a question about symptoms, body parts or the journal ("Do you still have a fever?").
+"""
+import math
+from collections import Counter
+from typing import Optional
+
+from services.health_lexicon import ANSWER_TERMS, BODY_PART_TERMS, JOURNAL_TERMS, SYMPTOM_TERMS, find_terms, is_negated, tokenize
+
+_HEALTH_TERMS = SYMPTOM_TERMS | BODY_PART_TERMS
+
+# (text, could change the journal)
+SEED_EXAMPLES = (
+    ("I have a headache since this morning", True),
+    ("my stomach hurts after eating", True),
+    ("masakit ang ulo ko", True),
+    ("nilalagnat ako kagabi", True),
+    ("I fell and my knee is swollen", True),
+    ("I can't sleep well lately", True),
+    ("I've been feeling really stressed at work", True),
+    ("the rash is spreading to my arm", True),
+    ("it got worse today", True),
+    ("it's much better now", True),
+    ("I took the medicine the doctor gave me", True),
+    ("okay na ako, gumaling na", True),
+    ("I feel dizzy when I stand up", True),
+    ("please remove the entry about my cough", True),
+    ("add this to my journal", True),
+    ("the pain is around 7 out of 10", True),
+    ("I started feeling it two days ago", True),
+    ("mas lumala po", True),
+    ("I'm so tired all the time", True),
+    ("my back is killing me", True),
+    ("thanks", False),
+    ("thank you so much", False),
+    ("ok", False),
+    ("okay", False),
+    ("hello", False),
+    ("hi Akasi", False),
+    ("good morning", False),
+    ("salamat po", False),
+    ("sige po", False),
+    ("bye", False),
+    ("see you later", False),
+    ("what can you do", False),
+    ("who made you", False),
+    ("lol", False),
+    ("nice", False),
+    ("got it", False),
+    ("no thanks", False),
+    ("can you speak tagalog", False),
+    ("how are you", False),
+)
+
+
+class JournalGate:
+    """
+    Decides whether a turn could change the wellness journal.
+
+    Args:
+        recall_target: Fraction of positive seed examples the classifier must let through.
+        examples: Labelled (text, bool) pairs to train on; SEED_EXAMPLES by default.
+    """
+
+    def __init__(self, recall_target: float = 0.95, examples: Optional[tuple] = None):
+        self.recall_target = recall_target
+        self.passed = 0
+        self.skipped = 0
+        self.pass_reasons: Counter = Counter()
+        self._train(examples or SEED_EXAMPLES)
+
+    def _train(self, examples) -> None:
+        counts = {True: Counter(), False: Counter()}
+        docs = Counter()
+        for text, label in examples:
+            counts[label].update(tokenize(text))
+            docs[label] += 1
+        vocabulary = set(counts[True]) | set(counts[False])
+        self._prior = math.log((docs[True] + 1) / (docs[False] + 1))
+        self._weights = {}
+        totals = {label: sum(counts[label].values()) + len(vocabulary) for label in (True, False)}
+        for token in vocabulary:
+            self._weights[token] = math.log((counts[True][token] + 1) / totals[True]) - math.log((counts[False][token] + 1) / totals[False])
+
+        # Lowest threshold that still meets the recall target on the positive examples
+        positive_scores = sorted(self.score(text) for text, label in examples if label)
+        cutoff = int(len(positive_scores) * (1 - self.recall_target))
+        self.threshold = positive_scores[min(cutoff, len(positive_scores) - 1)] if positive_scores else 0.0
+
+    def score(self, text: str) -> float:
+        """Log-odds that the text could change the journal (unknown tokens are ignored)."""
+        return self._prior + sum(self._weights.get(token, 0.0) for token in tokenize(text))
+
+    def _decide(self, text: str, has_entries: bool) -> Optional[str]:
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        if find_terms(tokens, JOURNAL_TERMS):
+            return "journal_terms"
+        negated = False
+        for position, _ in find_terms(tokens, _HEALTH_TERMS):
+            if not is_negated(tokens, position):
+                return "health_terms"
+            negated = True
+        if negated and has_entries:
+            return "negated_health_terms"
+        if self.score(text) >= self.threshold:
+            return "classifier"
+        return None
+
+    @staticmethod
+    def _answers_health_question(text: str, previous_reply: str) -> bool:
+        tokens = tokenize(text)
+        if not tokens or len(tokens) > 4 or not all(token in ANSWER_TERMS for token in tokens):
+            return False
+        # Only the sentences of the reply that ask something, not its advice or sympathy
+        questions = [sentence for sentence in previous_reply.replace("\n", " ").split("?")[:-1] if sentence.strip()]
+        for question in questions:
+            question_tokens = tokenize(question.rsplit(".", 1)[-1].rsplit("!", 1)[-1])
+            if find_terms(question_tokens, _HEALTH_TERMS | JOURNAL_TERMS):
+                return True
+        return False
+
+    def should_run(self, text: str, has_entries: bool = False, has_attachments: bool = False, previous_reply: str = "") -> bool:
+        """
+        Args:
+            text: The user's latest message and the tool output of the turn.
+            has_entries: Whether the conversation's journal currently has entries.
+            has_attachments: Whether the user attached files this turn.
+            previous_reply: Akasi's reply before the user's message, used only for bare yes/no answers.
+
+        Returns:
+            True if the journal controller should run for this turn.
+        """
+        reason = "attachments" if has_attachments else self._decide(text, has_entries)
+        if reason is None and self._answers_health_question(text, previous_reply):
+            reason = "answer_to_health_question"
+        if reason is None:
+            self.skipped += 1
+            return False
+        self.passed += 1
+        self.pass_reasons[reason] += 1
+        return True
+
+    def stats(self) -> dict:
+        total = self.passed + self.skipped
+        return {
+            "passed": self.passed,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / total, 3) if total else 0.0,
+            "pass_reasons": dict(self.pass_reasons),
+            "recall_target": self.recall_target,
+            "threshold": round(self.threshold, 3),
+        }
@@ -0,0 +1,244 @@
+"""
+Materialized wellness journal state per conversation.
+
+Journal operations (ADD / UPDATE / REMOVE) produced by the journal workflow or by the
+manual journal actions are applied to a canonical entry map instead of being appended
+to an operation log. Each conversation's journal keeps O(1) lookups by entry ID plus
+date and severity indexes and a version counter. Superseded operations are not kept,
+so the journal prompt only ever sees the entries that currently exist.
+
+Entry IDs are allocated by the server from a per-journal monotonic counter ("1", "2",
+...) and never reused, so they double as the short handles the journal model refers
+to. Model operations pass through JournalState.resolve() first: ADD gets a fresh ID and
+UPDATE/REMOVE must name an entry that exists, checked with a dict lookup.
+"""
+import re
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+ENTRY_FIELDS = (
+    "wellness_journal_entry_id",
+    "wellness_journal_title",
+    "wellness_journal_current_summary",
+    "wellness_journal_entry_date",
+    "wellness_journal_severity_value",
+)
+
+
+JOURNAL_CONTEXT_HEADER = "id | date | severity | title | summary"
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+
+
+def _words(text: str) -> set:
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def _cell(value) -> str:
+    """Table cell text with the column separator and newlines removed."""
+    return " ".join(str(value or "").replace("|", "/").split())
+
+
+def render_journal_context(entries: list[dict], recent_text: str = "", max_entries: int = 20, max_summary_chars: int = 160) -> str:
+    """
+    Renders current journal entries as a dense table for the journal-controller prompt.
+
+    Args:
+        entries: Current entries, least recently changed first (JournalState.current_entries()).
+        recent_text: Latest conversation text; entries sharing words with it rank higher.
+        max_entries: Maximum rows; the most relevant/recent entries are kept.
+        max_summary_chars: Summaries longer than this are truncated.
+
+    Returns:
+        "id | date | severity | title | summary" rows, or "(no entries)".
+    """
+    if not entries:
+        return "(no entries)"
+
+    if len(entries) > max_entries:
+        recent_words = _words(recent_text)
+        total = len(entries)
+
+        def score(position_and_entry):
+            position, entry = position_and_entry
+            overlap = len(recent_words & _words(f"{entry.get('wellness_journal_title', '')} {entry.get('wellness_journal_current_summary', '')}"))
+            return (overlap, position / total, _entry_date(entry))
+
+        ranked = sorted(enumerate(entries), key=score, reverse=True)[:max_entries]
+        entries = [entry for _, entry in sorted(ranked, key=lambda item: item[0])]
+
+    rows = [JOURNAL_CONTEXT_HEADER]
+    for entry in entries:
+        summary = _cell(entry.get("wellness_journal_current_summary"))
+        if len(summary) > max_summary_chars:
+            summary = summary[:max_summary_chars - 1].rstrip() + "…"
+        rows.append(" | ".join((
+            _cell(entry.get("wellness_journal_entry_id")),
+            _entry_date(entry),
+            str(_entry_severity(entry)),
+            _cell(entry.get("wellness_journal_title")),
+            summary,
+        )))
+    return "\n".join(rows)
+
+
+def _entry_date(entry: dict) -> str:
+    return str(entry.get("wellness_journal_entry_date") or "")[:10]
+
+
+def _entry_severity(entry: dict) -> int:
+    try:
+        return int(entry.get("wellness_journal_severity_value") or 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+class JournalState:
+    """Current journal entries of one conversation, with indexes and a version counter."""
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.by_date: dict[str, set] = defaultdict(set)
+        self.by_severity: dict[int, set] = defaultdict(set)
+        self.version = 0
+        self.last_id = 0
+        self.applied_operations = 0
+        self.compacted_operations = 0
+        self.rejected_operations = 0
+
+    def _index(self, entry_id: str, entry: dict) -> None:
+        self.by_date[_entry_date(entry)].add(entry_id)
+        self.by_severity[_entry_severity(entry)].add(entry_id)
+
+    def _unindex(self, entry_id: str, entry: dict) -> None:
+        self.by_date[_entry_date(entry)].discard(entry_id)
+        self.by_severity[_entry_severity(entry)].discard(entry_id)
+
+    def allocate_id(self) -> str:
+        """Next entry ID; IDs are never reused, even after REMOVE or clear()."""
+        self.last_id += 1
+        return str(self.last_id)
+
+    def resolve(self, operation: dict) -> Optional[dict]:
+        """
+        Validates a model-generated operation against the current entries.
+
+        Returns:
+            A copy with a newly allocated ID for ADD or the referenced entry's ID for
+            UPDATE/REMOVE, or None if the action is unknown or the entry does not exist.
+        """
+        action = operation.get("wellness_journal_entry_action")
+        if action == "ADD":
+            return {**operation, "wellness_journal_entry_id": self.allocate_id()}
+        if action in ("UPDATE", "REMOVE"):
+            # Tolerate handles written as "#3" or " 3 "
+            entry_id = str(operation.get("wellness_journal_entry_id") or "").strip().lstrip("#")
+            if entry_id in self.entries:
+                return {**operation, "wellness_journal_entry_id": entry_id}
+        self.rejected_operations += 1
+        return None
+
+    def apply(self, operation: dict) -> bool:
+        """
+        Applies one operation to the entry map.
+
+        Returns:
+            True if the journal changed; False for UPDATE/REMOVE of unknown IDs or unknown actions.
+        """
+        action = operation.get("wellness_journal_entry_action")
+        entry_id = str(operation.get("wellness_journal_entry_id") or "")
+        existing = self.entries.get(entry_id)
+
+        if action in ("ADD", "UPDATE") and entry_id and (action == "ADD" or existing is not None):
+            entry = {field: operation.get(field) for field in ENTRY_FIELDS if operation.get(field) is not None}
+            entry["wellness_journal_entry_id"] = entry_id
+            if existing is not None:
+                # The previous state of this entry is superseded rather than kept around
+                self._unindex(entry_id, existing)
+                entry = {**existing, **entry}
+                self.compacted_operations += 1
+            self.entries[entry_id] = entry
+            self.entries.move_to_end(entry_id)
+            self._index(entry_id, entry)
+        elif action == "REMOVE" and existing is not None:
+            self._unindex(entry_id, existing)
+            del self.entries[entry_id]
+            # Both the removed entry's operations and the REMOVE itself are dropped
+            self.compacted_operations += 2
+        else:
+            self.rejected_operations += 1
+            return False
+
+        self.applied_operations += 1
+        self.version += 1
+        return True
+
+    def get(self, entry_id) -> Optional[dict]:
+        return self.entries.get(str(entry_id))
+
+    def entries_on(self, date: str) -> list[dict]:
+        return [self.entries[entry_id] for entry_id in self.by_date.get(date[:10], ()) if entry_id in self.entries]
+
+    def entries_with_severity(self, severity: int) -> list[dict]:
+        return [self.entries[entry_id] for entry_id in self.by_severity.get(severity, ()) if entry_id in self.entries]
+
+    def current_entries(self) -> list[dict]:
+        """Current entries, least recently changed first."""
+        return list(self.entries.values())
+
+    def clear(self) -> None:
+        self.compacted_operations += len(self.entries)
+        self.entries.clear()
+        self.by_date.clear()
+        self.by_severity.clear()
+        self.version += 1
+
+
+class JournalStore:
+    """
+    JournalState per conversation key, least recently used keys dropped beyond max_keys.
+    """
+
+    def __init__(self, max_keys: int = 5000):
+        self.max_keys = max_keys
+        self._states: "OrderedDict[str, JournalState]" = OrderedDict()
+
+    def state(self, key: str) -> JournalState:
+        if key not in self._states:
+            self._states[key] = JournalState()
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        self._states.move_to_end(key)
+        return self._states[key]
+
+    def allocate_id(self, key: str) -> str:
+        return self.state(key).allocate_id()
+
+    def resolve(self, key: str, operation: dict) -> Optional[dict]:
+        return self.state(key).resolve(operation)
+
+    def apply(self, key: str, operation: dict) -> bool:
+        return self.state(key).apply(operation)
+
+    def get(self, key: str, entry_id) -> Optional[dict]:
+        state = self._states.get(key)
+        return state.get(entry_id) if state else None
+
+    def current_entries(self, key: str) -> list[dict]:
+        state = self._states.get(key)
+        return state.current_entries() if state else []
+
+    def clear(self, key: str) -> None:
+        if key in self._states:
+            self._states[key].clear()
+
+    def stats(self, key: Optional[str] = None) -> dict:
+        states = [self._states[key]] if key and key in self._states else ([] if key else list(self._states.values()))
+        return {
+            "keys": len(self._states),
+            "entries": sum(len(state.entries) for state in states),
+            "version": states[0].version if key and states else None,
+            "last_id": states[0].last_id if key and states else None,
+            "applied": sum(state.applied_operations for state in states),
+            "compacted": sum(state.compacted_operations for state in states),
+            "rejected": sum(state.rejected_operations for state in states),
+        }
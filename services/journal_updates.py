@@ -0,0 +1,112 @@
+"""
+Per-conversation queues of wellness journal updates waiting to be rendered.
+
+Background journal workflows publish operations here and the /htmx/get_journal_update
+route pops them, one per request. Every conversation key (user ID + conversation ID)
+has its own deque and asyncio lock, so users never receive each other's journal cards.
+Queues are size-limited; queued operations on the same entry are merged instead of
+piling up, and drops/merges are counted. The current journal itself lives in
+services.journal_store; this module only holds what the UI has not rendered yet.
+"""
+import asyncio
+from collections import OrderedDict, deque
+from typing import Optional
+
+
+class JournalUpdateBroker:
+    """
+    Journal update queues keyed by conversation.
+
+    Args:
+        max_queue_size: Pending operations kept per key; the oldest is dropped beyond this.
+        max_keys: Conversations tracked at once; the least recently used key is dropped beyond this.
+    """
+
+    def __init__(self, max_queue_size: int = 50, max_keys: int = 5000):
+        self.max_queue_size = max_queue_size
+        self.max_keys = max_keys
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.merged = 0
+
+    def _queue(self, key: str) -> deque:
+        if key not in self._queues:
+            self._queues[key] = deque()
+            while len(self._queues) > self.max_keys:
+                oldest, _ = self._queues.popitem(last=False)
+                self._locks.pop(oldest, None)
+        self._queues.move_to_end(key)
+        return self._queues[key]
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def _merge(self, queue: deque, update: dict) -> bool:
+        """
+        Folds an update into a queued operation on the same entry. Returns True if merged.
+        UPDATE over a queued ADD/UPDATE replaces its fields (an ADD stays an ADD);
+        REMOVE over a queued ADD cancels both, since the card was never shown.
+        """
+        entry_id = update.get("wellness_journal_entry_id")
+        action = update.get("wellness_journal_entry_action")
+        for index, queued in enumerate(queue):
+            if queued.get("wellness_journal_entry_id") != entry_id:
+                continue
+            queued_action = queued.get("wellness_journal_entry_action")
+            if action == "UPDATE" and queued_action in ("ADD", "UPDATE"):
+                queue[index] = {**update, "wellness_journal_entry_action": queued_action}
+                return True
+            if action == "REMOVE" and queued_action == "ADD":
+                del queue[index]
+                return True
+        return False
+
+    async def publish(self, key: str, update: dict) -> None:
+        """Queues an operation for a conversation."""
+        async with self._lock(key):
+            queue = self._queue(key)
+            self.published += 1
+            if self._merge(queue, update):
+                self.merged += 1
+                return
+            if len(queue) >= self.max_queue_size:
+                queue.popleft()
+                self.dropped += 1
+            queue.append(update)
+
+    async def pop(self, key: str) -> Optional[dict]:
+        """Returns the oldest pending operation for a conversation, or None."""
+        async with self._lock(key):
+            queue = self._queues.get(key)
+            if not queue:
+                return None
+            self.delivered += 1
+            return queue.popleft()
+
+    async def clear(self, key: str) -> int:
+        """Drops all pending operations for a conversation. Returns how many were dropped."""
+        async with self._lock(key):
+            queue = self._queues.get(key)
+            if not queue:
+                return 0
+            cleared = len(queue)
+            queue.clear()
+            return cleared
+
+    def pending(self, key: str) -> int:
+        return len(self._queues.get(key, ()))
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._queues),
+            "pending": sum(len(queue) for queue in self._queues.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "merged": self.merged,
+        }
@@ -0,0 +1,148 @@
+"""
+Message transformations applied to conversation history before it is re-sent.
+
+Attached images travel inside the user's HumanMessage as base64 blocks. Once the turn
+that introduced them is finished, later calls only need to know that an image was
+sent and what it showed, so the blocks are replaced with a short text reference plus
+the medical image summary produced by summarize_medical_images_tool_interface.
+"""
+import base64
+import binascii
+import hashlib
+from typing import Callable, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+IMAGE_SUMMARY_TOOL_NAME = "summarize_medical_images_tool_interface"
+# Text that replaces a stripped image block (see strip_image_blocks)
+ATTACHED_IMAGE_REF_PREFIX = "[Attached image "
+
+
+def image_content_hash(b64_data: str, media_type: str = "image/jpeg") -> str:
+    """SHA-256 of the decoded image bytes and media type (falls back to the raw string if not valid base64)."""
+    try:
+        raw = base64.b64decode(b64_data, validate=False)
+    except (binascii.Error, ValueError):
+        raw = b64_data.encode("utf-8")
+    digest = hashlib.sha256()
+    digest.update(media_type.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(raw)
+    return digest.hexdigest()
+
+
+def _image_block_data(part) -> Optional[tuple[str, str]]:
+    """Returns (base64 data, media type) for an image content block, else None."""
+    if not isinstance(part, dict) or part.get("type") != "image":
+        return None
+    source = part.get("source") or {}
+    if source.get("type") != "base64" or not source.get("data"):
+        return None
+    return source["data"], source.get("media_type", "image/jpeg")
+
+
+def has_image_blocks(message: BaseMessage) -> bool:
+    return isinstance(message.content, list) and any(_image_block_data(part) for part in message.content)
+
+
+def turn_image_summaries(messages: list[BaseMessage]) -> dict[str, str]:
+    """
+    Maps each HumanMessage id to the image tool summary produced later in the same turn.
+    """
+    summaries: dict[str, str] = {}
+    current_human_id = None
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            current_human_id = message.id
+        elif isinstance(message, ToolMessage) and message.name == IMAGE_SUMMARY_TOOL_NAME and current_human_id:
+            text = str(message.content)
+            if text and not text.startswith("Error"):
+                summaries[current_human_id] = text
+    return summaries
+
+
+def strip_image_blocks(message: HumanMessage, summary: Optional[str] = None, summary_lookup: Optional[Callable[[list[str]], Optional[str]]] = None) -> HumanMessage:
+    """
+    Returns a copy of the message (same id) with image blocks replaced by text references.
+
+    Args:
+        message: HumanMessage that may contain base64 image blocks.
+        summary: Summary text for the images, when already known from the turn.
+        summary_lookup: Optional callable taking the image hashes and returning a cached summary.
+    """
+    if not has_image_blocks(message):
+        return message
+
+    new_parts = []
+    image_hashes = []
+    for part in message.content:
+        image = _image_block_data(part)
+        if image is None:
+            new_parts.append(part)
+            continue
+        data, media_type = image
+        content_hash = image_content_hash(data, media_type)
+        image_hashes.append(content_hash)
+        new_parts.append({"type": "text", "text": f"{ATTACHED_IMAGE_REF_PREFIX}{len(image_hashes)}: {media_type}, ref {content_hash[:12]}]"})
+
+    if summary is None and summary_lookup is not None:
+        summary = summary_lookup(image_hashes)
+    new_parts.append({"type": "text", "text": f"[Image summary: {summary}]" if summary else "[Image summary: not available]"})
+
+    return message.model_copy(update={"content": new_parts})
+
+
+def strip_images_from_history(
+    messages: list[BaseMessage],
+    keep_latest_turn: bool = False,
+    summary_lookup: Optional[Callable[[list[str]], Optional[str]]] = None,
+) -> list[BaseMessage]:
+    """
+    Replaces image blocks across the history with references and summaries.
+
+    Args:
+        messages: Conversation history.
+        keep_latest_turn: Leave the most recent HumanMessage untouched (the turn still needs its images)
+            until the image tool has summarized them in this turn; after that the summary replaces them.
+        summary_lookup: Optional cached-summary lookup passed to strip_image_blocks.
+    """
+    summaries = turn_image_summaries(messages)
+    latest_human_index = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+    stripped = []
+    for index, message in enumerate(messages):
+        keep = keep_latest_turn and index == latest_human_index and message.id not in summaries
+        if isinstance(message, HumanMessage) and has_image_blocks(message) and not keep:
+            message = strip_image_blocks(message, summaries.get(message.id), summary_lookup)
+        stripped.append(message)
+    return stripped
+
+
+def latest_turn_has_images(messages: list[BaseMessage]) -> bool:
+    """True if the most recent turn carried images, whether still inline or already stripped to references."""
+    latest_human_index = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+    if latest_human_index < 0:
+        return False
+    for message in messages[latest_human_index:]:
+        if isinstance(message, ToolMessage) and message.name == IMAGE_SUMMARY_TOOL_NAME:
+            return True
+        if isinstance(message, HumanMessage):
+            if has_image_blocks(message):
+                return True
+            if isinstance(message.content, list) and any(
+                isinstance(part, dict) and str(part.get("text", "")).startswith(ATTACHED_IMAGE_REF_PREFIX) for part in message.content
+            ):
+                return True
+    return False
+
+
+def image_free_replacements(messages: list[BaseMessage], summary_lookup: Optional[Callable[[list[str]], Optional[str]]] = None) -> list[BaseMessage]:
+    """
+    Stripped copies of only the messages that still carry images. Returning these from a
+    node replaces the originals in the graph state (add_messages matches on message id).
+    """
+    summaries = turn_image_summaries(messages)
+    return [
+        strip_image_blocks(message, summaries.get(message.id), summary_lookup)
+        for message in messages
+        if isinstance(message, HumanMessage) and message.id and has_image_blocks(message)
+    ]
@@ -0,0 +1,121 @@
+"""
+Per-node model routing for the Akasi.ai graphs.
+
+Each graph node (agent, image tool, scanner, journal, summary) is mapped to a model ID
+with its own max_tokens and temperature, plus an optional cheaper fallback model that
+is tried when the primary call fails (throttling, timeouts, unavailable model).
+Settings come from the defaults passed in by main.py, then an optional JSON config
+file, then environment variables:
+
+    AKASI_MODEL_CONFIG=/path/models.json   {"scanner": {"model": "haiku", "max_tokens": 64}}
+    AKASI_MODEL_SCANNER=haiku
+    AKASI_MODEL_SCANNER_MAX_TOKENS=64
+    AKASI_MODEL_SCANNER_TEMPERATURE=0
+    AKASI_MODEL_SCANNER_FALLBACK=haiku      ("none" disables the fallback)
+
+Model values may be aliases (e.g. "haiku") resolved through the alias table. Chat
+clients are built once per (model, max_tokens, temperature) and shared between nodes.
+"""
+import json
+import os
+import threading
+from typing import Any, Callable, Optional
+
+SPEC_FIELDS = ("model", "max_tokens", "temperature", "fallback_model")
+
+
+class ModelRegistry:
+    """
+    Resolves node names to shared chat model clients.
+
+    Args:
+        defaults: {node: {"model", "max_tokens", "temperature", "fallback_model"}}.
+        client_factory: Callable(model_id, max_tokens=..., temperature=...) -> chat model.
+        aliases: Short names accepted in configuration, mapped to model IDs.
+        config_path: JSON file with per-node overrides; AKASI_MODEL_CONFIG if None.
+        environ: Environment mapping for overrides; os.environ if None.
+    """
+
+    def __init__(
+        self,
+        defaults: dict[str, dict],
+        client_factory: Callable[..., Any],
+        aliases: Optional[dict[str, str]] = None,
+        config_path: Optional[str] = None,
+        environ: Optional[dict] = None,
+    ):
+        self.client_factory = client_factory
+        self.aliases = aliases or {}
+        self._clients: dict[tuple, Any] = {}
+        self._runnables: dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.specs = {node: dict(spec) for node, spec in defaults.items()}
+
+        environ = os.environ if environ is None else environ
+        config_path = config_path or environ.get("AKASI_MODEL_CONFIG")
+        if config_path:
+            with open(config_path, "r", encoding="utf-8") as f:
+                for node, overrides in json.load(f).items():
+                    self.specs.setdefault(node, {}).update({key: value for key, value in overrides.items() if key in SPEC_FIELDS})
+
+        for node, spec in self.specs.items():
+            prefix = f"AKASI_MODEL_{node.upper()}"
+            if environ.get(prefix):
+                spec["model"] = environ[prefix]
+            if environ.get(f"{prefix}_MAX_TOKENS"):
+                spec["max_tokens"] = int(environ[f"{prefix}_MAX_TOKENS"])
+            if environ.get(f"{prefix}_TEMPERATURE"):
+                spec["temperature"] = float(environ[f"{prefix}_TEMPERATURE"])
+            if environ.get(f"{prefix}_FALLBACK"):
+                spec["fallback_model"] = environ[f"{prefix}_FALLBACK"]
+
+        for node, spec in self.specs.items():
+            spec["model"] = self._model_id(spec.get("model"))
+            if not spec["model"]:
+                raise ValueError(f"No model configured for node '{node}'")
+            fallback = spec.get("fallback_model")
+            spec["fallback_model"] = None if not fallback or str(fallback).lower() == "none" else self._model_id(fallback)
+
+    def _model_id(self, model: Optional[str]) -> Optional[str]:
+        return self.aliases.get(model, model) if model else None
+
+    def _client(self, model_id: str, max_tokens: Optional[int], temperature: Optional[float]):
+        key = (model_id, max_tokens, temperature)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self.client_factory(model_id, max_tokens=max_tokens, temperature=temperature)
+            return self._clients[key]
+
+    def _build(self, node: str, cache_key: tuple, adapt: Callable[[Any], Any]):
+        with self._lock:
+            if cache_key in self._runnables:
+                return self._runnables[cache_key]
+        spec = self.specs[node]
+        primary = adapt(self._client(spec["model"], spec.get("max_tokens"), spec.get("temperature")))
+        if spec.get("fallback_model") and spec["fallback_model"] != spec["model"]:
+            fallback = adapt(self._client(spec["fallback_model"], spec.get("max_tokens"), spec.get("temperature")))
+            primary = primary.with_fallbacks([fallback])
+        with self._lock:
+            return self._runnables.setdefault(cache_key, primary)
+
+    def chat(self, node: str, with_fallback: bool = True):
+        """Chat model for a node, wrapped with its fallback tier unless 'with_fallback' is False."""
+        if not with_fallback:
+            spec = self.specs[node]
+            return self._client(spec["model"], spec.get("max_tokens"), spec.get("temperature"))
+        return self._build(node, (node, "chat"), lambda client: client)
+
+    def structured(self, node: str, schema):
+        """Structured-output runnable for a node (built once per node and schema)."""
+        return self._build(node, (node, "structured", schema), lambda client: client.with_structured_output(schema))
+
+    def with_tools(self, node: str, tools: list):
+        """Tool-bound runnable for a node (built once per node and tool set)."""
+        return self._build(node, (node, "tools", tuple(tool.name for tool in tools)), lambda client: client.bind_tools(tools))
+
+    def describe(self) -> dict:
+        """Resolved node -> model settings, for logging."""
+        return {node: dict(spec) for node, spec in self.specs.items()}
+
+    def stats(self) -> dict:
+        return {"nodes": len(self.specs), "clients": len(self._clients), "runnables": len(self._runnables)}
@@ -0,0 +1,149 @@
+"""
+Memo cache for body scanner commands.
+
+The scanner command is decided by what the user said last and the question Akasi asked
+before it, so retried turns and duplicate HTMX submits ask the commander the same question
+again. Commands are cached, with LRU eviction and a TTL, under a hash of
+
+* the conversation's thread ID, so a short answer ("yes", "it hurts") never reuses a
+  command decided for another user or conversation,
+* Akasi's reply before the latest user message (the question being answered), and
+* the last K user messages (lowercased, whitespace-collapsed text, with image references).
+
+Akasi's reply to the latest message is left out, since a retry gets a freshly generated
+one. A user message repeated back to back counts once and keeps the question it first
+answered, so a retry that appends another copy of the same message maps to the same key.
+Identical requests that arrive while the first one is still running wait for it instead
+of starting another workflow run.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from services.context_manager import message_text
+
+
+def _normalized_text(message: BaseMessage) -> str:
+    return " ".join(message_text(message).lower().split())
+
+
+def scanner_turn_key(messages: list[BaseMessage], last_k: int, thread_id: Optional[str] = None) -> Optional[str]:
+    """
+    Stable hash of the thread ID, Akasi's reply before the latest user message and the last
+    'last_k' distinct consecutive user messages. None (not cached) without a thread ID or user messages.
+    """
+    if not thread_id:
+        return None
+    user_texts: list[str] = []
+    question = ""
+    last_reply = ""
+    for message in messages:
+        if isinstance(message, AIMessage) and message_text(message).strip():
+            last_reply = _normalized_text(message)
+        elif isinstance(message, HumanMessage):
+            normalized = _normalized_text(message)
+            # A repeated message (retry) keeps the question its first copy answered
+            if not user_texts or user_texts[-1] != normalized:
+                user_texts.append(normalized)
+                question = last_reply
+    tail = user_texts[-last_k:] if last_k > 0 else user_texts
+    if not tail:
+        return None
+    digest = hashlib.sha256()
+    digest.update(f"{thread_id}\x00{question}\x00".encode("utf-8"))
+    for normalized in tail:
+        digest.update(f"{normalized}\x00".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ScannerCommandCache:
+    """
+    LRU + TTL cache of scanner commands keyed by thread, Akasi's last question and the user's latest messages.
+
+    Args:
+        last_k: Number of trailing user messages that make up the key.
+        max_entries: Maximum number of cached commands.
+        ttl_seconds: How long a command stays valid.
+    """
+
+    def __init__(self, last_k: int = 2, max_entries: int = 2048, ttl_seconds: float = 300):
+        self.last_k = last_k
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if not key or key not in self._entries:
+            return None
+        stored_at, command = self._entries[key]
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return command
+
+    def put(self, key: Optional[str], command: str) -> None:
+        if not key:
+            return
+        self._entries[key] = (time.monotonic(), command)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, messages: list[BaseMessage], compute: Callable[[], Awaitable[str]], thread_id: Optional[str] = None) -> str:
+        """
+        Returns the cached command for this turn of the thread, joins an identical
+        in-flight computation, or runs 'compute' and caches its result.
+        """
+        key = scanner_turn_key(messages, self.last_k, thread_id)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        if key in self._in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self._in_flight[key])
+
+        self.misses += 1
+        if key is None:
+            return await compute()
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            command = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise; mark retrieved so an unobserved failure is not logged twice
+            future.exception()
+            raise
+        else:
+            self.put(key, command)
+            future.set_result(command)
+            return command
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,540 @@
+"""
+Durable LangGraph checkpointer backed by a local SQLite file (via apsw).
+
+Conversations survive restarts and redeploys and no longer all live in the web process
+heap. Checkpoints are serialized with the saver's serde (langgraph's JsonPlusSerializer,
+which encodes with ormsgpack), the database runs in WAL mode, and a small connection
+pool lets concurrent async turns read while another turn writes.
+
+Channel values are not stored inside each checkpoint row. Like langgraph's own savers,
+a channel is written to the blobs table only when its version changes, and checkpoints
+reference the versions they use (checkpoint_blobs). The "messages" channel is stored as
+a delta (replaced and appended messages) against its previous version, with a full copy
+every 'full_snapshot_every' versions, so the file no longer grows with turns x steps x
+full history. Rows written before this layout (channel values inline) are still read.
+
+Pending sends (Send fan-out written to the TASKS channel) are rebuilt from the parent
+checkpoint's writes, as langgraph's MemorySaver does.
+
+compact() drops superseded checkpoints, their pending writes and every blob no longer
+reachable from a remaining checkpoint. run_sweeper()/ensure_sweeper() run it periodically;
+every worker process may start a sweeper on the shared file, so each sweep first takes a
+lease row in the database and only the lease holder compacts.
+"""
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Sequence
+
+import apsw
+from langgraph.checkpoint.base import WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple
+from langgraph.checkpoint.serde.types import TASKS
+
+from services.checkpoint_memory import DELTA_BLOB_PREFIX, _message_signature
+
+SCHEMA_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT,
+        checkpoint BLOB,
+        metadata_type TEXT,
+        metadata BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT,
+        value BLOB,
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        channel TEXT NOT NULL,
+        version TEXT NOT NULL,
+        type TEXT NOT NULL,
+        value BLOB,
+        base_version TEXT,
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        version TEXT NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, channel)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sweeper_lease (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+)
+
+_MISSING = object()
+
+
+class _ConnectionPool:
+    """Bounded pool of apsw connections to one WAL database file."""
+
+    def __init__(self, path: str, size: int = 4, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle: "queue.LifoQueue[apsw.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> apsw.Connection:
+        conn = apsw.Connection(self.path)
+        conn.setbusytimeout(self.busy_timeout_ms)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[apsw.Connection]:
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    conn = self._open()
+            if conn is None:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """
+    BaseCheckpointSaver storing checkpoints and pending writes in SQLite.
+
+    Args:
+        path: Database file path (created if missing).
+        pool_size: Maximum number of pooled connections.
+        full_snapshot_every: Maximum delta chain length before a full copy of "messages" is stored again.
+        max_tracked_threads: Threads whose latest "messages" version is remembered for deltas (LRU).
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, full_snapshot_every: int = 8, max_tracked_threads: int = 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.pool = _ConnectionPool(path, size=pool_size)
+        self.delta_channels = ("messages",)
+        self.full_snapshot_every = full_snapshot_every
+        self.max_tracked_threads = max_tracked_threads
+        # (thread_id, checkpoint_ns, channel) -> (version, message signatures, delta chain depth)
+        self._latest_channel: "OrderedDict[tuple, tuple[str, list, int]]" = OrderedDict()
+        self._latest_lock = threading.Lock()
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self._lease_holder = f"{os.getpid()}:{uuid.uuid4().hex}"
+        with self.pool.connection() as conn:
+            with conn:
+                for statement in SCHEMA_STATEMENTS:
+                    conn.execute(statement)
+
+    # --- Helpers ---
+    def _load_writes(self, conn, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list:
+        rows = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((type_, value))) for task_id, channel, type_, value in rows]
+
+    def _load_pending_sends(self, conn, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]) -> list:
+        if not parent_checkpoint_id:
+            return []
+        rows = conn.execute(
+            "SELECT type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+        ).fetchall()
+        return [self.serde.loads_typed((type_, value)) for type_, value in rows]
+
+    def _load_channel(self, conn, thread_id: str, checkpoint_ns: str, channel: str, version: str):
+        row = conn.execute(
+            "SELECT type, value, base_version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            (thread_id, checkpoint_ns, channel, version),
+        ).fetchone()
+        if row is None or row[0] == "empty":
+            return _MISSING
+        type_, value, base_version = row
+        if not type_.startswith(DELTA_BLOB_PREFIX):
+            return self.serde.loads_typed((type_, value))
+
+        changed = self.serde.loads_typed((type_[len(DELTA_BLOB_PREFIX):], value))
+        base = self._load_channel(conn, thread_id, checkpoint_ns, channel, base_version)
+        messages = list(base) if base is not _MISSING else []
+        positions = {getattr(m, "id", None): i for i, m in enumerate(messages)}
+        for message in changed:
+            index = positions.get(getattr(message, "id", None))
+            if index is None:
+                messages.append(message)
+            else:
+                messages[index] = message
+        return messages
+
+    def _channel_blob(self, conn, thread_id: str, checkpoint_ns: str, channel: str, version: str, values: dict) -> tuple:
+        """(type, value, base_version) row for a new channel version; "messages" becomes a delta when possible."""
+        if channel not in values:
+            return "empty", None, None
+        value = values[channel]
+        if channel not in self.delta_channels or not isinstance(value, list):
+            return (*self.serde.dumps_typed(value), None)
+
+        key = (thread_id, checkpoint_ns, channel)
+        signatures = [_message_signature(m) for m in value]
+        with self._latest_lock:
+            previous = self._latest_channel.get(key)
+        blob = None
+        depth = 0
+        if previous is not None:
+            previous_version, previous_signatures, previous_depth = previous
+            previous_ids = [signature[0] for signature in previous_signatures]
+            # Deltas only cover "same order, some replaced, some appended"; anything else is stored in full
+            if (
+                previous_depth < self.full_snapshot_every
+                and None not in previous_ids
+                and [signature[0] for signature in signatures[:len(previous_ids)]] == previous_ids
+                and conn.execute(
+                    "SELECT 1 FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    (thread_id, checkpoint_ns, channel, previous_version),
+                ).fetchone()
+            ):
+                changed = [
+                    message for index, message in enumerate(value)
+                    if index >= len(previous_signatures) or signatures[index] != previous_signatures[index]
+                ]
+                inner_type, payload = self.serde.dumps_typed(changed)
+                blob = (f"{DELTA_BLOB_PREFIX}{inner_type}", payload, previous_version)
+                depth = previous_depth + 1
+        if blob is None:
+            blob = (*self.serde.dumps_typed(value), None)
+
+        with self._latest_lock:
+            self._latest_channel[key] = (version, signatures, depth)
+            self._latest_channel.move_to_end(key)
+            while len(self._latest_channel) > self.max_tracked_threads:
+                self._latest_channel.popitem(last=False)
+        return blob
+
+    def _row_to_tuple(self, conn, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, serialized_checkpoint, metadata_type, metadata = row
+        checkpoint = self.serde.loads_typed((type_, serialized_checkpoint))
+        # Older rows carry their channel values inline
+        if not checkpoint.get("channel_values"):
+            channel_values = {}
+            for channel, version in checkpoint.get("channel_versions", {}).items():
+                value = self._load_channel(conn, thread_id, checkpoint_ns, channel, str(version))
+                if value is not _MISSING:
+                    channel_values[channel] = value
+            checkpoint["channel_values"] = channel_values
+        checkpoint["pending_sends"] = self._load_pending_sends(conn, thread_id, checkpoint_ns, parent_checkpoint_id)
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=self._load_writes(conn, thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    # --- Sync API ---
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable.get("checkpoint_id")
+        columns = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self.pool.connection() as conn:
+            if checkpoint_id:
+                row = conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._row_to_tuple(conn, row) if row else None
+
+    def list(self, config, *, filter: Optional[dict[str, Any]] = None, before=None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+        if before and before["configurable"].get("checkpoint_id"):
+            clauses.append("checkpoint_id < ?")
+            params.append(before["configurable"]["checkpoint_id"])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+            f"FROM checkpoints {where} ORDER BY checkpoint_id DESC"
+        )
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, tuple(params)).fetchall()
+            results = []
+            for row in rows:
+                checkpoint_tuple = self._row_to_tuple(conn, row)
+                # Metadata is msgpack-encoded, so filters are applied after decoding
+                if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(checkpoint_tuple)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        values = checkpoint.get("channel_values", {})
+        type_, serialized_checkpoint = self.serde.dumps_typed({**checkpoint, "channel_values": {}})
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        with self.pool.connection() as conn:
+            with conn:
+                # Only channels whose version changed are written; the rest are referenced
+                for channel, version in new_versions.items():
+                    blob_type, blob_value, base_version = self._channel_blob(conn, thread_id, checkpoint_ns, channel, str(version), values)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO blobs (thread_id, checkpoint_ns, channel, version, type, value, base_version) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, channel, str(version), blob_type, blob_value, base_version),
+                    )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoint_blobs (thread_id, checkpoint_ns, checkpoint_id, channel, version) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (thread_id, checkpoint_ns, checkpoint["id"], channel, str(version))
+                        for channel, version in checkpoint.get("channel_versions", {}).items()
+                    ],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints "
+                    "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                     type_, serialized_checkpoint, metadata_type, serialized_metadata),
+                )
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        configurable = config["configurable"]
+        # Special channels (errors, interrupts...) overwrite; regular writes keep the first value
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            rows.append((
+                configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"],
+                task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, serialized_value, task_path,
+            ))
+        with self.pool.connection() as conn:
+            with conn:
+                conn.executemany(
+                    f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+                conn.execute("DELETE FROM blobs WHERE thread_id = ?", (thread_id,))
+                conn.execute("DELETE FROM checkpoint_blobs WHERE thread_id = ?", (thread_id,))
+        with self._latest_lock:
+            for key in [key for key in self._latest_channel if key[0] == thread_id]:
+                del self._latest_channel[key]
+
+    def get_next_version(self, current, channel) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(str(current).split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def compact(self, keep_latest: Optional[int] = 1) -> dict:
+        """
+        Drops all but the newest `keep_latest` checkpoints per thread/namespace (None keeps
+        all), plus the pending writes and channel blobs only they referenced, then
+        checkpoints and truncates the WAL.
+
+        Returns:
+            Counts of deleted checkpoint, write and blob rows.
+        """
+        with self.pool.connection() as conn:
+            with conn:
+                deleted_checkpoints = 0
+                if keep_latest is not None:
+                    conn.execute(
+                        "DELETE FROM checkpoints WHERE rowid IN ("
+                        " SELECT rowid FROM ("
+                        "  SELECT rowid, ROW_NUMBER() OVER (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn"
+                        "  FROM checkpoints"
+                        " ) WHERE rn > ?"
+                        ")",
+                        (keep_latest,),
+                    )
+                    deleted_checkpoints = conn.changes()
+                # TASKS writes of a dropped parent are kept while a remaining child rebuilds its pending sends from them
+                conn.execute(
+                    "DELETE FROM writes WHERE NOT EXISTS ("
+                    " SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+                    " AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id"
+                    ") AND NOT (writes.channel = ? AND EXISTS ("
+                    " SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+                    " AND c.checkpoint_ns = writes.checkpoint_ns AND c.parent_checkpoint_id = writes.checkpoint_id"
+                    "))",
+                    (TASKS,),
+                )
+                deleted_writes = conn.changes()
+                conn.execute(
+                    "DELETE FROM checkpoint_blobs WHERE NOT EXISTS ("
+                    " SELECT 1 FROM checkpoints c WHERE c.thread_id = checkpoint_blobs.thread_id"
+                    " AND c.checkpoint_ns = checkpoint_blobs.checkpoint_ns AND c.checkpoint_id = checkpoint_blobs.checkpoint_id"
+                    ")"
+                )
+                # A referenced delta keeps its whole base chain alive
+                conn.execute(
+                    "WITH RECURSIVE live(thread_id, checkpoint_ns, channel, version) AS ("
+                    " SELECT thread_id, checkpoint_ns, channel, version FROM checkpoint_blobs"
+                    " UNION"
+                    " SELECT b.thread_id, b.checkpoint_ns, b.channel, b.base_version FROM blobs b"
+                    " JOIN live l ON b.thread_id = l.thread_id AND b.checkpoint_ns = l.checkpoint_ns"
+                    " AND b.channel = l.channel AND b.version = l.version"
+                    " WHERE b.base_version IS NOT NULL"
+                    ") "
+                    "DELETE FROM blobs WHERE (thread_id, checkpoint_ns, channel, version) NOT IN (SELECT * FROM live)"
+                )
+                deleted_blobs = conn.changes()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"deleted_checkpoints": deleted_checkpoints, "deleted_writes": deleted_writes, "deleted_blobs": deleted_blobs}
+
+    # --- Sweeper ---
+    def _acquire_lease(self, lease_seconds: float) -> bool:
+        """Takes (or renews) the database-wide sweeper lease; False while another saver holds it."""
+        now = time.time()
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute(
+                    "INSERT INTO sweeper_lease (name, holder, expires_at) VALUES ('compact', ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE sweeper_lease.expires_at < ? OR sweeper_lease.holder = excluded.holder",
+                    (self._lease_holder, now + lease_seconds, now),
+                )
+                return conn.changes() > 0
+
+    def sweep(self, keep_latest: Optional[int] = 1, lease_seconds: Optional[float] = None) -> Optional[dict]:
+        """
+        Compacts the database and reports what was deleted, the resulting stats and the duration.
+        With 'lease_seconds', returns None without compacting while another process holds the lease.
+        """
+        if lease_seconds is not None and not self._acquire_lease(lease_seconds):
+            return None
+        started_at = time.perf_counter()
+        report = self.compact(keep_latest)
+        report["stats"] = self.stats()
+        report["duration_seconds"] = time.perf_counter() - started_at
+        return report
+
+    async def run_sweeper(self, interval_seconds: float, keep_latest: Optional[int] = 1, on_report: Optional[Callable[[dict], None]] = None) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                # The lease outlives one interval slightly, so the holder renews it before anyone else can take it
+                report = await asyncio.to_thread(self.sweep, keep_latest, interval_seconds * 1.5)
+                if report is not None and on_report:
+                    on_report(report)
+            except Exception as e:
+                print(f"Error in checkpoint sweeper: {e}")
+
+    def ensure_sweeper(self, interval_seconds: float, keep_latest: Optional[int] = 1, on_report: Optional[Callable[[dict], None]] = None) -> None:
+        """Starts the periodic compaction on the running event loop if it is not already running."""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self.run_sweeper(interval_seconds, keep_latest, on_report))
+
+    def stats(self) -> dict:
+        """Returns thread and checkpoint counts and the database size in bytes."""
+        with self.pool.connection() as conn:
+            threads, checkpoints = conn.execute("SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints").fetchone()
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {"threads": threads, "checkpoints": checkpoints, "bytes": page_count * page_size}
+
+    # --- Async API (apsw is blocking, so run on worker threads) ---
+    async def aget_tuple(self, config) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter: Optional[dict[str, Any]] = None, before=None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def acompact(self, keep_latest: Optional[int] = 1) -> dict:
+        return await asyncio.to_thread(self.compact, keep_latest)
+
+    async def astats(self) -> dict:
+        return await asyncio.to_thread(self.stats)
+
+    def close(self) -> None:
+        self.pool.close()
@@ -37,7 +37,10 @@ determine the appropriate command for a virtual body scanner animation. Your goa
 reflects the current focus of the conversation regarding the patient's health.
 It is imperative that you select a command exclusively from this list and meticulously follow the guidelines 
 provided below when making your decision. Output only the selected command.
-**Guidelines for choosing the command:**
+"""
+
+# Command guidelines on their own, also used by the fused turn prompt (which has its own output format)
+BODY_SCANNER_COMMAND_GUIDELINES = """**Guidelines for choosing the command:**
 * **"START_SCAN"**: If the conversation indicates the beginning of a new health discussion, Akasi is initiating a general inquiry, or the user expresses readiness to begin.
 * **"STOP_SCAN"**: If the conversation suggests the patient wants to end the discussion, Akasi is concluding, or the information gathering for a phase seems complete.
 * **"idle"**: If the conversation is general, not focused on specific physical symptoms or body parts, Akasi is transitioning, or no specific body part is clearly indicated by the *latest* parts of the conversation. Use this if the discussion is more about feelings, general state, or if Akasi has just asked a broad opening question.
@@ -47,6 +50,7 @@ provided below when making your decision. Output only the selected command.
 * **"FULL_BODY_GLOW"**: If the conversation discusses systemic issues (e.g., overall fatigue, widespread pain, fever, issues related to blood, hormones, immune system, skeletal system as a whole, general wellness checks, or if Akasi is making a broad summary or asking about overall feeling after discussing specifics).
 Analyze the **entire flow and current focus** of the conversation. The command should reflect what body part or action is most relevant to Akasi's information gathering at the **current stage** of the dialogue. Pay close attention to the user's latest messages and Akasi's most recent questions.
 """
+BODY_SCANNER_SYSTEM_MESSAGE_CONTENT += BODY_SCANNER_COMMAND_GUIDELINES
 
 # System message for the wellness journal entry controller workflow
 # Note: This template includes {current_date_manila_iso} placeholders that need to be formatted when used
@@ -56,13 +60,16 @@ You MUST output a single JSON object that strictly conforms to the 'WellnessJour
 
 **Inputs You Will Receive:**
 1.  **Conversation History:** The dialogue between the patient and Akasi.
-2.  **Existing Wellness Journal Entries:** A JSON string representing a list of current journal entries. Each entry in this list follows the same structure as your output. If no entries exist, this might be an empty list or null.
+2.  **Existing Wellness Journal Entries:** A compact table of the current journal entries, one per line, with the columns `id | date | severity | title | summary` (these map to `wellness_journal_entry_id`, `wellness_journal_entry_date`, `wellness_journal_severity_value`, `wellness_journal_title` and `wellness_journal_current_summary`). Long summaries may be truncated with "…". If no entries exist, it reads "(no entries)".
 
 
 **Your Task:**
 Based on a thorough analysis of these inputs, decide on ONE action ('ADD', 'UPDATE', or 'REMOVE') and construct the corresponding JSON output. Focus on the most recent and relevant parts of the conversation to guide your decision, but be aware of the entire context and existing entries.
 
-**Guidelines for Determining the Action and Fields:**
+"""
+
+# Field and action guidelines on their own, also used by the fused turn prompt (which has its own output format)
+WELLNESS_JOURNAL_GUIDELINES_TEMPLATE = """**Guidelines for Determining the Action and Fields:**
 
 **General:**
 * `wellness_journal_entry_date`: This field is mandatory and must always be in **YYYY-MM-DD format.**
@@ -80,31 +87,56 @@ Based on a thorough analysis of these inputs, decide on ONE action ('ADD', 'UPDA
 
 **If `wellness_journal_entry_action` is "ADD":**
 * **When to ADD:** The conversation introduces a new, distinct health concern, event, significant symptom update, or a topic that is not adequately covered by any existing journal entry.
-* `wellness_journal_entry_id`: Generate a new, unique string identifier. If existing entries have numerical IDs like "1", "2", the new ID should be the next sequential number (e.g., "3"). If no entries exist, start with "1".
+* `wellness_journal_entry_id`: Use "NEW". The server assigns the ID of new entries, so do not try to pick the next number yourself.
 * `wellness_journal_title`: Create a concise, new title that accurately reflects the main subject of this new entry based on the conversation (e.g., "Sudden Lower Back Pain," "Discussion about Sleep Quality").
 * `wellness_journal_current_summary`: Write a comprehensive summary detailing the relevant information, symptoms, patient statements, and context for this new entry from the current conversation.
 * `wellness_journal_entry_date`: Use the date the event/symptom occurred if mentioned, or the current date of the conversation.
 
 **If `wellness_journal_entry_action` is "UPDATE":**
 * **When to UPDATE:** The conversation provides significant new information, clarifications, progress updates, or changes related to an *existing* wellness journal entry. The new information should modify or add to the existing entry rather than represent an entirely new topic.
-* `wellness_journal_entry_id`: This MUST be the `wellness_journal_entry_id` of the specific existing entry that needs to be updated. Carefully match it from the provided list of entries.
+* `wellness_journal_entry_id`: This MUST be the `id` of the specific existing entry that needs to be updated, exactly as shown in the provided table of entries.
 * `wellness_journal_title`: Usually, this will be the same as the existing entry's title. Only change it if the core subject of the entry has significantly evolved due to the new information in the conversation.
 * `wellness_journal_current_summary`: This is crucial. The summary should reflect the *latest state* of the journaled topic. It might involve integrating new information with the old, replacing outdated details, or adding new observations from the conversation.
 * `wellness_journal_entry_date`: Update to the date of the new information or the current date of the conversation.
 
 **If `wellness_journal_entry_action` is "REMOVE":**
 * **When to REMOVE:** The conversation explicitly indicates that an existing journal entry is no longer relevant, an issue has been fully resolved and the user wants it archived/removed, or the user directly requests its deletion. Do not remove entries lightly; there should be a clear signal.
-* `wellness_journal_entry_id`: This MUST be the `wellness_journal_entry_id` of the specific existing entry to be removed.
+* `wellness_journal_entry_id`: This MUST be the `id` of the specific existing entry to be removed, exactly as shown in the provided table of entries.
 * `wellness_journal_title`: Use the title of the entry being removed.
 * `wellness_journal_current_summary`: Use the summary from the entry being removed, or a placeholder like "Entry marked for removal."
 * `wellness_journal_entry_date`: Use the date from the entry being removed or the current date.
 
 **Important Considerations:**
 * **One Action Only:** You must decide on a single operation (ADD, UPDATE, or REMOVE) per analysis.
-* **ID Management for UPDATE/REMOVE:** Be extremely careful to use the correct existing `wellness_journal_entry_id` when updating or removing. If no suitable existing entry is found for an update, consider if it should be an ADD operation instead.
+* **ID Management for UPDATE/REMOVE:** Be extremely careful to use the correct existing `id` from the table when updating or removing. Operations that reference an ID not in the table are discarded. If no suitable existing entry is found for an update, consider if it should be an ADD operation instead.
 * **Focus on User Intent:** Interpret the conversation to understand what the user intends regarding their journal. Akasi's questions and the patient's responses are key.
 * **Clarity and Conciseness:** Ensure titles and summaries are clear, concise, and accurately reflect the conversation.
+"""
 
+WELLNESS_JOURNAL_SYSTEM_MESSAGE_TEMPLATE += WELLNESS_JOURNAL_GUIDELINES_TEMPLATE + """
 Analyze the inputs carefully and generate the single JSON object representing the most appropriate wellness journal operation. YOU CAN RETURN "NONE" IF THERE IS NO NEED TO PUT AN ENTRY
 
-""" 
\ No newline at end of file
+""" 
+# System message for the rolling conversation summary used by the context manager
+CONTEXT_SUMMARY_SYSTEM_MESSAGE_CONTENT = (
+    "You maintain a running summary of a conversation between a patient and Akasi, an AI health assistant. "
+    "You will receive the previous summary (possibly empty) and a transcript of newer, older-than-recent turns. "
+    "Return an updated summary of at most 120 words that keeps every health fact the patient shared: symptoms, body parts, "
+    "onset dates, severity, medications, history and image/tool findings. Drop pleasantries. Output only the summary text."
+)
+
+# Appended to the Akasi system message in the fused turn mode (AKASI_TURN_MODE=fused), where one
+# structured response carries the reply, the body scanner command and the journal operation
+FUSED_TURN_SYSTEM_MESSAGE_TEMPLATE = """
+
+**Structured turn output:**
+Besides your reply to the patient, you also drive the body scanner animation and the patient's wellness journal in this same response.
+* `reply`: Your normal reply to the patient, exactly as you would otherwise write it.
+* `body_scanner_command`: The scanner command for the current focus of the conversation, chosen with these guidelines:
+{body_scanner_guidelines}
+* `wellness_journal_operation`: Null unless the latest exchange adds, updates or resolves something worth recording. When it does, fill its fields following these journal guidelines:
+{wellness_journal_guidelines}
+
+**Existing wellness journal entries:**
+{existing_journal_entries}
+"""
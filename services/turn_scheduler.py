@@ -0,0 +1,94 @@
+"""
+Per-turn scheduling of the secondary LangGraph workflows.
+
+After the main Akasi agent produces its reply, the body scanner commander and the
+wellness journal controller both need the same conversation. They do not depend on
+each other, so this module starts them side by side instead of one after another.
+The scanner result is awaited (the UI needs it for the response); the journal task
+keeps running in the background and feeds the journal update queue.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+
+class TurnScheduler:
+    """
+    Starts the body scanner and journal workflows concurrently for a chat turn.
+
+    Args:
+        run_scanner: Async callable taking a message list and returning a scanner command string.
+        run_journal: Async callable taking a message list; its result is not awaited by the turn.
+        speculative_scanner: When True, the scanner is started on the user message alone
+            while the main agent is still thinking, and its result is reused for the turn.
+    """
+
+    def __init__(
+        self,
+        run_scanner: Callable[[list], Awaitable[str]],
+        run_journal: Callable[[list], Awaitable[Any]],
+        speculative_scanner: bool = False,
+    ):
+        self.run_scanner = run_scanner
+        self.run_journal = run_journal
+        self.speculative_scanner = speculative_scanner
+        # Strong references so fire-and-forget journal tasks are not garbage collected mid-flight
+        self._background_tasks: set[asyncio.Task] = set()
+
+    def start_speculative_scan(self, messages: list, **workflow_kwargs) -> Optional[asyncio.Task]:
+        """
+        Starts the scanner on the incoming user message before the agent reply exists.
+
+        Returns:
+            The running task, or None when speculative mode is disabled.
+        """
+        if not self.speculative_scanner:
+            return None
+        return asyncio.create_task(self.run_scanner(messages, **workflow_kwargs))
+
+    @staticmethod
+    def discard_speculative_scan(speculative_scan: Optional[asyncio.Task]) -> None:
+        """Cancels a speculative scan whose result will not be used, retrieving any exception it already raised."""
+        if speculative_scan is None:
+            return
+        speculative_scan.cancel()
+        speculative_scan.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def run_secondary_workflows(self, messages: list, speculative_scan: Optional[asyncio.Task] = None, **workflow_kwargs) -> dict:
+        """
+        Runs the scanner and journal workflows for a completed agent turn.
+
+        Args:
+            messages: The full conversation after the agent reply.
+            speculative_scan: Task returned by start_speculative_scan, if any.
+            **workflow_kwargs: Extra state (e.g. conversation_summary) passed to both workflows.
+
+        Returns:
+            A dict with the scanner command, how long the turn waited for it,
+            and whether the speculative result was used.
+        """
+        started_at = time.perf_counter()
+
+        journal_task = asyncio.create_task(self.run_journal(messages, **workflow_kwargs))
+        self._background_tasks.add(journal_task)
+        journal_task.add_done_callback(self._background_tasks.discard)
+
+        used_speculative = speculative_scan is not None
+        scanner_task = speculative_scan if used_speculative else asyncio.create_task(self.run_scanner(messages, **workflow_kwargs))
+
+        try:
+            body_scanner_command = await scanner_task
+        except Exception as e:
+            print(f"Error in body scanner workflow: {e}")
+            body_scanner_command = "idle"
+
+        return {
+            "body_scanner_command": body_scanner_command or "idle",
+            "scanner_wait_seconds": time.perf_counter() - started_at,
+            "used_speculative_scan": used_speculative,
+        }
+
+    @property
+    def pending_background_tasks(self) -> int:
+        """Number of journal tasks still running."""
+        return len(self._background_tasks)
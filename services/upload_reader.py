@@ -0,0 +1,219 @@
+"""
+Streaming, memory-bounded reading of chat uploads.
+
+* limit_receive() wraps the ASGI receive channel so the raw request body is counted as it
+  arrives and an oversized request is cut off while the multipart form is still being
+  parsed (chunked requests carry no Content-Length to check up front).
+* Uploads are then read in fixed-size chunks into a temporary file on disk, hashed
+  incrementally with SHA-256, and checked as they arrive: the content type is sniffed
+  from the first chunk's magic bytes, so files that are not images are rejected before
+  the rest is read, and each file must stay under 'max_file_bytes' and all files of a
+  request together under 'max_request_bytes' (UploadBudget). Callers hand the file's
+  path on (e.g. to the image normalizer's worker process) instead of its bytes.
+
+Rejections (by reason) and bytes processed are counted in UploadMetrics.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+
+# (offset, magic bytes, content type); WEBP and HEIC are checked separately
+_MAGIC_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"%PDF-", "application/pdf"),
+)
+_HEIC_BRANDS = (b"heic", b"heix", b"hevc", b"hevx", b"mif1", b"msf1")
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from a file's leading bytes, or None if unrecognized."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIC_BRANDS:
+        return "image/heic"
+    for offset, magic, content_type in _MAGIC_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    return None
+
+
+class UploadRejected(Exception):
+    """An upload was refused; 'reason' is a short metric label."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class UploadBudget:
+    """Bytes still allowed for the current request, shared by all of its files."""
+
+    def __init__(self, max_request_bytes: int):
+        self.max_request_bytes = max_request_bytes
+        self.used = 0
+
+    def release(self, size: int) -> None:
+        self.used = max(0, self.used - size)
+
+    def consume(self, size: int) -> None:
+        self.used += size
+        if self.used > self.max_request_bytes:
+            raise UploadRejected("request_too_large", f"Attachments exceed the {self.max_request_bytes // (1024 * 1024)} MB limit per message")
+
+
+class UploadMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.bytes_processed = 0
+        self.rejected: Counter = Counter()
+
+    def record_accepted(self, size: int) -> None:
+        with self._lock:
+            self.accepted += 1
+            self.bytes_processed += size
+
+    def record_rejected(self, reason: str, size: int = 0) -> None:
+        with self._lock:
+            self.rejected[reason] += 1
+            self.bytes_processed += size
+
+    def reclassify_rejected(self, reason: str) -> None:
+        """Moves a file counted as accepted to the rejections (its bytes were already counted)."""
+        with self._lock:
+            self.accepted = max(0, self.accepted - 1)
+            self.rejected[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"accepted": self.accepted, "rejected": dict(self.rejected), "bytes_processed": self.bytes_processed}
+
+
+class UploadReader:
+    """
+    Reads UploadFile objects chunk by chunk under size and type limits.
+
+    Args:
+        accepted_content_types: Sniffed types that may be uploaded.
+        max_file_bytes: Size limit per file.
+        max_request_bytes: Size limit for all files of one request (see new_budget()).
+        chunk_size: Bytes per read.
+        spool_dir: Directory for the temporary upload files (system default if None).
+    """
+
+    # Multipart boundaries, headers and text fields on top of the files themselves
+    FORM_OVERHEAD_BYTES = 64 * 1024
+
+    def __init__(
+        self,
+        accepted_content_types: set,
+        max_file_bytes: int = 10 * 1024 * 1024,
+        max_request_bytes: int = 25 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+        spool_dir: Optional[str] = None,
+    ):
+        self.accepted_content_types = set(accepted_content_types)
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.chunk_size = chunk_size
+        self.spool_dir = spool_dir
+        self.metrics = UploadMetrics()
+
+    def new_budget(self) -> UploadBudget:
+        return UploadBudget(self.max_request_bytes)
+
+    def check_content_length(self, content_length: Optional[str]) -> None:
+        """Rejects a request whose declared body is larger than the per-request limit (plus form overhead)."""
+        try:
+            declared = int(content_length or 0)
+        except ValueError:
+            return
+        if declared > self.max_request_bytes + self.FORM_OVERHEAD_BYTES:
+            self._reject_request()
+
+    def _reject_request(self) -> None:
+        self.metrics.record_rejected("request_too_large")
+        raise UploadRejected("request_too_large", f"Attachments exceed the {self.max_request_bytes // (1024 * 1024)} MB limit per message")
+
+    def limit_receive(self, receive: Callable[[], Awaitable[dict]]) -> Callable[[], Awaitable[dict]]:
+        """
+        Wraps an ASGI receive callable so the request body is cut off with UploadRejected
+        once it exceeds the per-request limit, instead of being buffered in full first.
+        """
+        limit = self.max_request_bytes + self.FORM_OVERHEAD_BYTES
+        received = 0
+
+        async def limited_receive() -> dict:
+            nonlocal received
+            message = await receive()
+            if message.get("type") == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    self._reject_request()
+            return message
+
+        return limited_receive
+
+    def reject_after_read(self, upload: dict, budget: UploadBudget, reason: str) -> None:
+        """Records a file accepted by read() but refused later (e.g. a type that could not be converted)."""
+        budget.release(upload["size"])
+        self.metrics.reclassify_rejected(reason)
+
+    async def read(self, file_upload, budget: UploadBudget) -> dict:
+        """
+        Streams one upload into a temporary file on disk.
+
+        Returns:
+            {"path", "size", "sha256", "content_type"}. The caller removes "path".
+
+        Raises:
+            UploadRejected: Empty, unrecognized/unsupported type, or over a size limit.
+        """
+        spooled = tempfile.NamedTemporaryFile(dir=self.spool_dir, prefix="akasi-upload-", delete=False)
+        digest = hashlib.sha256()
+        size = 0
+        consumed = 0
+        content_type = None
+        try:
+            while True:
+                chunk = await file_upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                if content_type is None:
+                    content_type = sniff_content_type(chunk)
+                    if content_type not in self.accepted_content_types:
+                        raise UploadRejected("unsupported_type", f"Unsupported file type: {content_type or file_upload.content_type or 'unknown'}")
+                size += len(chunk)
+                if size > self.max_file_bytes:
+                    raise UploadRejected("file_too_large", f"File exceeds the {self.max_file_bytes // (1024 * 1024)} MB limit")
+                consumed += len(chunk)
+                budget.consume(len(chunk))
+                digest.update(chunk)
+                spooled.write(chunk)
+            if size == 0:
+                raise UploadRejected("empty", "File is empty")
+        except UploadRejected as e:
+            spooled.close()
+            os.remove(spooled.name)
+            if e.reason != "request_too_large":
+                # A skipped file does not count against the other files of the request
+                budget.release(consumed)
+            self.metrics.record_rejected(e.reason, size)
+            raise
+        except BaseException:
+            spooled.close()
+            os.remove(spooled.name)
+            raise
+
+        spooled.close()
+        self.metrics.record_accepted(size)
+        return {"path": spooled.name, "size": size, "sha256": digest.hexdigest(), "content_type": content_type}
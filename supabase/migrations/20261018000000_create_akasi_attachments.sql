@@ -0,0 +1,18 @@
+-- Content-addressed chat attachments (services/attachment_store.py).
+-- Blobs live in the private "akasi-attachments" storage bucket at <sha256[:2]>/<sha256>;
+-- this table maps attachment IDs to blobs.
+
+create table if not exists public.akasi_attachments (
+    id uuid primary key default gen_random_uuid(),
+    sha256 text not null,
+    content_type text,
+    filename text,
+    size_bytes bigint not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists akasi_attachments_sha256_idx on public.akasi_attachments (sha256);
+
+insert into storage.buckets (id, name, public)
+values ('akasi-attachments', 'akasi-attachments', false)
+on conflict (id) do nothing;
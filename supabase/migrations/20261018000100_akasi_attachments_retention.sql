@@ -0,0 +1,21 @@
+-- Attachment retention (services/attachment_gc.py).
+-- consumed_at is set once the turn that uploaded an attachment has been answered;
+-- gc_deferred_until postpones rows of conversations that still reference their images.
+
+alter table public.akasi_attachments
+    add column if not exists conversation_id text,
+    add column if not exists consumed_at timestamptz,
+    add column if not exists gc_deferred_until timestamptz;
+
+create index if not exists akasi_attachments_consumed_at_idx
+    on public.akasi_attachments (consumed_at);
+create index if not exists akasi_attachments_unconsumed_created_at_idx
+    on public.akasi_attachments (created_at) where consumed_at is null;
+
+-- Blobs whose last metadata row was deleted; removed from storage after a grace period
+-- if no new row has started referencing them.
+create table if not exists public.akasi_attachment_tombstones (
+    sha256 text primary key,
+    size_bytes bigint not null default 0,
+    created_at timestamptz not null default now()
+);
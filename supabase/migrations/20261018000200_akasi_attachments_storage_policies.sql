@@ -0,0 +1,27 @@
+-- Storage access for the "akasi-attachments" bucket (services/attachment_store.py).
+-- The bucket is private and storage.objects has row-level security, so without these
+-- policies the server's anon-key client is refused on upload, download and GC removal.
+-- The client runs as anon, or as authenticated once a user has signed in through it.
+-- Upserting an existing blob needs update as well as insert. Deployments that set
+-- SUPABASE_SERVICE_ROLE_KEY_NEW use the service role for blobs, which bypasses RLS.
+
+drop policy if exists "akasi attachments select" on storage.objects;
+create policy "akasi attachments select" on storage.objects
+    for select to anon, authenticated
+    using (bucket_id = 'akasi-attachments');
+
+drop policy if exists "akasi attachments insert" on storage.objects;
+create policy "akasi attachments insert" on storage.objects
+    for insert to anon, authenticated
+    with check (bucket_id = 'akasi-attachments');
+
+drop policy if exists "akasi attachments update" on storage.objects;
+create policy "akasi attachments update" on storage.objects
+    for update to anon, authenticated
+    using (bucket_id = 'akasi-attachments')
+    with check (bucket_id = 'akasi-attachments');
+
+drop policy if exists "akasi attachments delete" on storage.objects;
+create policy "akasi attachments delete" on storage.objects
+    for delete to anon, authenticated
+    using (bucket_id = 'akasi-attachments');
@@ -0,0 +1,13 @@
+-- Sweeper lease for the attachment garbage collector (services/attachment_gc.py).
+-- Every web worker runs a collector; a sweep only proceeds in the worker that holds
+-- (or renews) the lease, so sweeps do not overlap.
+
+create table if not exists public.akasi_attachment_gc_lease (
+    name text primary key,
+    holder text,
+    expires_at timestamptz not null default '-infinity'
+);
+
+insert into public.akasi_attachment_gc_lease (name)
+values ('attachment_gc')
+on conflict (name) do nothing;